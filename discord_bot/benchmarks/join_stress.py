@@ -0,0 +1,113 @@
+"""Stress tournament joins: thousands of concurrent joins against a few tournaments.
+
+Each join checks the tournament, hits an await point (standing in for a
+save or fetch, ``--delay`` seconds) and then appends. Three strategies are
+compared:
+
+* ``unlocked``: check, await, append, the way handlers did it without locks
+* ``global``: the same under one lock shared by every tournament
+* ``keyed``: ``StateStore.join_tournament``, locked per tournament, with the
+  await injected through its ``before_join`` hook
+
+For each strategy the script reports joins/sec, how many tournaments ended
+up over capacity and how many participants were registered twice. It exits
+non-zero if the ``keyed`` run broke either invariant.
+
+Usage:
+    python benchmarks/join_stress.py [--joins 5000] [--tournaments 20] [--size 50] [--users 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import StateStore, join_error  # noqa: E402
+
+
+def make_data(tournaments: int, size: int) -> dict:
+    data = {'users': {}, 'tournaments': {}}
+    for i in range(1, tournaments + 1):
+        data['tournaments'][f'tournament_{i}'] = {
+            'id': f'tournament_{i}',
+            'creator': '0',
+            'size': size,
+            'participants': [],
+            'status': 'registration',
+            'winner': None
+        }
+    return data
+
+
+async def join_unlocked(data: dict, tournament_id: str, user_id: str, delay: float):
+    tournament = data['tournaments'][tournament_id]
+    if join_error(tournament, user_id):
+        return
+    await asyncio.sleep(delay)
+    tournament['participants'].append(user_id)
+
+
+async def join_global(lock: asyncio.Lock, data: dict, tournament_id: str, user_id: str, delay: float):
+    async with lock:
+        await join_unlocked(data, tournament_id, user_id, delay)
+
+
+async def run(strategy: str, args) -> dict:
+    data = make_data(args.tournaments, args.size)
+    store = StateStore(data)
+    lock = asyncio.Lock()
+    rng = random.Random(args.seed)
+    joins = [(f'tournament_{rng.randint(1, args.tournaments)}', str(rng.randint(1, args.users)))
+             for _ in range(args.joins)]
+
+    def one(tournament_id: str, user_id: str):
+        if strategy == 'unlocked':
+            return join_unlocked(data, tournament_id, user_id, args.delay)
+        if strategy == 'global':
+            return join_global(lock, data, tournament_id, user_id, args.delay)
+        return store.join_tournament(tournament_id, user_id, before_join=lambda t: asyncio.sleep(args.delay))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(tournament_id, user_id) for tournament_id, user_id in joins))
+    elapsed = time.perf_counter() - started
+
+    tournaments = data['tournaments'].values()
+    return {
+        'joins/s': len(joins) / elapsed,
+        'joined': sum(len(t['participants']) for t in tournaments),
+        'overfilled': sum(len(t['participants']) > t['size'] for t in tournaments),
+        'duplicates': sum(len(t['participants']) - len(set(t['participants'])) for t in tournaments),
+        'locks left': len(store.locks)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--joins', type=int, default=5000)
+    parser.add_argument('--tournaments', type=int, default=20)
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--delay', type=float, default=0.001, help="seconds awaited between check and append")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.joins} joins over {args.tournaments} tournaments of {args.size}, "
+          f"{args.users} users, {args.delay * 1000:.1f}ms await per join\n")
+    print(f"{'strategy':>10} {'joins/s':>10} {'joined':>8} {'overfilled':>11} {'duplicates':>11} {'locks left':>11}")
+    results = {}
+    for strategy in ('unlocked', 'global', 'keyed'):
+        result = results[strategy] = asyncio.run(run(strategy, args))
+        print(f"{strategy:>10} {result['joins/s']:>10,.0f} {result['joined']:>8} {result['overfilled']:>11} "
+              f"{result['duplicates']:>11} {result['locks left']:>11}")
+
+    keyed = results['keyed']
+    if keyed['overfilled'] or keyed['duplicates'] or keyed['locks left']:
+        print("\nFAILED: keyed locking broke a tournament invariant")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
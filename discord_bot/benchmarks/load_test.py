@@ -0,0 +1,282 @@
+"""Offline load test: replay a message mix through on_message without Discord.
+
+Starts a local aiohttp server standing in for PokeAPI, imports the bot with
+its data directory pointed at a temporary folder, then feeds fake messages
+through ``on_message`` at a fixed rate (open loop: new messages keep
+arriving whether or not earlier ones have finished). Replies are captured
+instead of being sent.
+
+Reports p50/p99 latency per message kind, achieved messages/sec and
+memory growth over the run.
+
+Usage:
+    python benchmarks/load_test.py --rate 200 --duration 30 \\
+        --mix chat=60,w=15,roll=10,stats=10,gamble=5
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from aiohttp import web  # noqa: E402
+
+MESSAGE_KINDS = {
+    'chat': lambda rng, users: random_chat(rng),
+    'w': lambda rng, users: 'e!w',
+    'roll': lambda rng, users: '!roll 1025',
+    'stats': lambda rng, users: '!stats' if rng.random() < 0.5 else f'!stats week {rng.choice(users).mention}',
+    'gamble': lambda rng, users: '!gamble log {} {} {}'.format(*(u.mention for u in rng.sample(users, 2)), rng.randint(1, 500)),
+}
+WORDS = ['gg', 'anyone', 'trade', 'shiny', 'lol', 'nice', 'roll', 'when', 'tournament', 'tonight', 'pokemon']
+
+
+def random_chat(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+
+
+def rss_kb() -> int:
+    """Current resident set size in KiB (peak RSS where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Fake Discord objects -------------------------------------------------------
+
+class FakePermissions:
+    administrator = True
+
+
+class FakeMember:
+    bot = False
+    avatar = None
+    guild_permissions = FakePermissions()
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = self.display_name = f"Trainer{user_id % 10000}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeGuild:
+    filesize_limit = 25 * 1024 * 1024
+
+    def __init__(self, guild_id: int, members):
+        self.id = guild_id
+        self.name = "Load Test Server"
+        self.members = {member.id: member for member in members}
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+    def typing(self):
+        return FakeTyping()
+
+
+class FakeMessage:
+    _state = None
+
+    def __init__(self, message_id: int, content: str, author: FakeMember, channel: FakeChannel):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.created_at = datetime.now(timezone.utc)
+        self.mentions = [channel.guild.get_member(int(i)) for i in re.findall(r'<@!?(\d+)>', content)]
+        self.attachments = []
+
+
+def patch_discord(commands):
+    """Route the few discord.py calls that would hit the network to the fakes"""
+    async def context_send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def convert_member(self, ctx, argument):
+        match = re.match(r'<@!?(\d+)>$', argument) or re.match(r'(\d+)$', argument)
+        member = ctx.guild.get_member(int(match.group(1))) if match else None
+        if member is None:
+            raise commands.MemberNotFound(argument)
+        return member
+
+    commands.Context.send = context_send
+    commands.Context.typing = lambda self, **kwargs: FakeTyping()
+    commands.MemberConverter.convert = convert_member
+
+
+# Stub PokeAPI ---------------------------------------------------------------
+
+async def start_pokeapi_stub(delay: float):
+    async def pokemon(request):
+        if delay:
+            await asyncio.sleep(delay)
+        pokemon_id = int(request.match_info['pokemon_id'])
+        return web.json_response({
+            'id': pokemon_id,
+            'name': f'pokemon{pokemon_id}',
+            'height': 10,
+            'weight': 100,
+            'types': [{'type': {'name': 'normal'}}],
+            'sprites': {'front_default': None}
+        })
+
+    app = web.Application()
+    app.router.add_get('/api/v2/pokemon/{pokemon_id}', pokemon)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/api/v2'
+
+
+# Driver ---------------------------------------------------------------------
+
+def parse_mix(text: str):
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        if kind not in MESSAGE_KINDS:
+            raise SystemExit(f"Unknown message kind {kind!r}; choose from {', '.join(MESSAGE_KINDS)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args):
+    runner, base_url = await start_pokeapi_stub(args.api_delay / 1000)
+    os.environ['POKEAPI_BASE_URL'] = base_url
+
+    import bot as ewager_bot
+    from discord.ext import commands
+    patch_discord(commands)
+    # Commands compare message authors against the logged-in bot user
+    bot_user = FakeMember(100000000000000000)
+    bot_user.bot = True
+    ewager_bot.bot._connection.user = bot_user
+    ewager_bot.bus.start()
+    ewager_bot.scheduler.start()
+
+    rng = random.Random(args.seed)
+    users = [FakeMember(200000000000000000 + i) for i in range(args.users)]
+    guild = FakeGuild(300000000000000000, users)
+    channel = FakeChannel(400000000000000000, guild)
+    kinds, weights = zip(*parse_mix(args.mix).items())
+
+    latencies = {kind: [] for kind in kinds}
+    errors = 0
+
+    async def deliver(kind: str, message: FakeMessage):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await ewager_bot.on_message(message)
+        except Exception as e:
+            errors += 1
+            if errors <= 5:
+                print(f"{kind} failed: {e!r}")
+        latencies[kind].append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    rss_before = rss_kb()
+    total = int(args.rate * args.duration)
+    interval = 1 / args.rate
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total):
+        kind = rng.choices(kinds, weights)[0]
+        message = FakeMessage(500000000000000000 + i, MESSAGE_KINDS[kind](rng, users), rng.choice(users), channel)
+        tasks.append(asyncio.create_task(deliver(kind, message)))
+        # Keep to the target schedule rather than sleeping a fixed interval
+        delay = started + (i + 1) * interval - time.perf_counter()
+        await asyncio.sleep(max(0, delay))
+    sent = time.perf_counter()
+    await asyncio.gather(*tasks)
+    replied = time.perf_counter()
+    await ewager_bot.bus.close()
+    await ewager_bot.flush_saves()
+    drained = time.perf_counter()
+    rss_after = rss_kb()
+    traced_current, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await ewager_bot.scheduler.close()
+    ewager_bot.trades.close()
+    await runner.cleanup()
+
+    print(f"\n{total} messages sent in {sent - started:.2f}s ({total / (sent - started):.1f} msg/s offered, "
+          f"target {args.rate:g}), all handled after {replied - started:.2f}s "
+          f"({total / (replied - started):.1f} msg/s); {channel.sent} replies, {errors} errors")
+    print(f"Event queue drained {(drained - replied) * 1000:.0f}ms after the last reply")
+    print(f"RSS {rss_before / 1024:.1f}MB -> {rss_after / 1024:.1f}MB "
+          f"(+{(rss_after - rss_before) / 1024:.1f}MB); traced Python allocations "
+          f"{traced_current / 1e6:.1f}MB now, {traced_peak / 1e6:.1f}MB peak\n")
+    print(f"{'kind':>8} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind in kinds:
+        samples = latencies[kind]
+        if samples:
+            print(f"{kind:>8} {len(samples):>7} {percentile(samples, 0.5) * 1000:>8.2f} "
+                  f"{percentile(samples, 0.99) * 1000:>8.2f} {max(samples) * 1000:>8.2f}")
+
+    print("\nBot-side latency (from !latency):")
+    for kind, name, count, p50, p99 in ewager_bot.bus.metrics.summary():
+        print(f"  {kind:>10} {name:<18} p50 {p50:7.2f}ms  p99 {p99:7.2f}ms  ({count})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=100, help="messages per second")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of traffic to send")
+    parser.add_argument('--mix', default='chat=60,w=15,roll=10,stats=10,gamble=5',
+                        help=f"weighted message kinds ({', '.join(MESSAGE_KINDS)})")
+    parser.add_argument('--users', type=int, default=200, help="distinct fake users")
+    parser.add_argument('--api-delay', type=float, default=20, help="stub PokeAPI response delay in ms")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # The bot keeps its data files in the working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='ewager_load_') as data_dir:
+        os.chdir(data_dir)
+        try:
+            asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
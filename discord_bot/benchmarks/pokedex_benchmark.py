@@ -0,0 +1,88 @@
+"""Measure Pokemon name index build time and autocomplete lookups/sec.
+
+Uses the bot's cached ``pokemon_names.json`` when given, otherwise a
+synthetic list of 1025 names. Each query set is replayed for a fixed
+number of rounds against ``PokedexIndex.search``.
+
+Usage:
+    python benchmarks/pokedex_benchmark.py [--names pokemon_names.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pokedex import PokedexIndex  # noqa: E402
+
+SYLLABLES = ['pi', 'ka', 'chu', 'char', 'man', 'der', 'bul', 'ba', 'saur', 'squir', 'tle', 'gar', 'chomp',
+             'eev', 'ee', 'mew', 'two', 'lu', 'gi', 'ra', 'yu', 'dra', 'go', 'nite', 'zu', 'bat', 'ni', 'do']
+
+
+def synthetic_names(count: int = 1025, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    names = {}
+    while len(names) < count:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        if name not in names.values():
+            names[len(names) + 1] = name
+    return names
+
+
+def typos(name: str, rng: random.Random) -> str:
+    """Drop, swap or replace one character"""
+    chars = list(name.lower())
+    i = rng.randrange(len(chars))
+    edit = rng.choice(('drop', 'swap', 'replace'))
+    if edit == 'drop' and len(chars) > 3:
+        del chars[i]
+    elif edit == 'swap' and i < len(chars) - 1:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+    return ''.join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--names', help="JSON file of {id: name}, e.g. the bot's pokemon_names.json")
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.names:
+        with open(args.names) as f:
+            names = {int(pokemon_id): name for pokemon_id, name in json.load(f).items()}
+    else:
+        names = synthetic_names()
+
+    started = time.perf_counter()
+    index = PokedexIndex(names)
+    print(f"Built index over {len(index)} names in {(time.perf_counter() - started) * 1000:.1f}ms\n")
+
+    rng = random.Random(1)
+    all_names = list(names.values())
+    query_sets = {
+        'empty': [''] * args.queries,
+        'prefix-1': [rng.choice(all_names)[:1] for _ in range(args.queries)],
+        'prefix-4': [rng.choice(all_names)[:4] for _ in range(args.queries)],
+        'exact': [rng.choice(all_names) for _ in range(args.queries)],
+        'typo': [typos(rng.choice(all_names), rng) for _ in range(args.queries)],
+        'number': [str(rng.randint(1, len(names))) for _ in range(args.queries)],
+    }
+
+    print(f"{'queries':>10} {'lookups/s':>12} {'mean us':>9} {'max us':>9}")
+    for label, queries in query_sets.items():
+        timings = []
+        for query in queries:
+            t = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - t)
+        total = sum(timings)
+        print(f"{label:>10} {len(queries) / total:>12,.0f} {total / len(queries) * 1e6:>9.1f} {max(timings) * 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Compare cold-start time and memory of the JSON and snapshot loaders.
+
+Generates synthetic data files with the requested numbers of Pokemon rolls,
+then loads each one in a fresh interpreter and reports the wall time to load
+and fetch one user's record, plus that process's resident memory once
+loaded, above the baseline of an interpreter that loads nothing.
+
+Usage:
+    python benchmarks/startup_benchmark.py --rolls 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import OwnershipIndex  # noqa: E402
+from memory import rss_bytes  # noqa: E402
+from snapshot import load_snapshot, write_snapshot  # noqa: E402
+
+TYPES = ['Normal', 'Fire', 'Water', 'Grass', 'Electric', 'Psychic', 'Dragon', 'Ghost']
+
+
+def synthetic_data(rolls: int, seed: int = 1) -> dict:
+    """Build a data dict shaped like the bot's, with ``rolls`` rolls spread over users"""
+    rng = random.Random(seed)
+    user_count = max(10, rolls // 200)
+    users = {}
+    start = datetime(2024, 1, 1)
+    for i in range(user_count):
+        user_id = str(100000000000000000 + i)
+        users[user_id] = {'id': user_id, 'pokemon_rolls': [], 'created_at': start.isoformat()}
+    user_ids = list(users)
+
+    for i in range(rolls):
+        pokemon_id = rng.randint(1, 1025)
+        users[rng.choice(user_ids)]['pokemon_rolls'].append({
+            'id': pokemon_id,
+            'name': f"Pokemon{pokemon_id}",
+            'types': rng.sample(TYPES, rng.randint(1, 2)),
+            'height': rng.randint(1, 200) / 10,
+            'weight': rng.randint(1, 9999) / 10,
+            'guild_id': str(rng.randint(1, 5)),
+            'timestamp': (start + timedelta(seconds=i * 30)).isoformat()
+        })
+
+    logs = []
+    for i in range(rolls // 10):
+        winner, loser = rng.sample(user_ids, 2)
+        logs.append({
+            'winner_id': winner,
+            'loser_id': loser,
+            'logged_by': winner,
+            'guild_id': str(rng.randint(1, 5)),
+            'timestamp': (start + timedelta(seconds=i * 300)).isoformat()
+        })
+
+    return {'users': users, 'tournaments': {}, 'gambling_logs': logs, 'rollups': {}, 'ledger': {}}
+
+
+def child(fmt: str, path: str, user_id: str):
+    """Run one cold start in this process and print the measurements as JSON"""
+    started = time.perf_counter()
+    if fmt == 'json':
+        with open(path) as f:
+            data = json.load(f)
+    elif fmt == 'snapshot':
+        data, indexes = load_snapshot(path)
+        OwnershipIndex().load(indexes['owners'])
+    else:
+        data = {'users': {user_id: {}}}
+    loaded = time.perf_counter()
+    data['users'][user_id]
+    finished = time.perf_counter()
+
+    # Current RSS, not ru_maxrss: on Linux a child inherits the peak of the
+    # parent that just built the dataset, which would swamp the loader's own use
+    print(json.dumps({'load': loaded - started, 'first_user': finished - loaded, 'rss_kb': rss_bytes() // 1024}))
+
+
+def run_child(fmt: str, path: str, user_id: str) -> dict:
+    output = subprocess.check_output([sys.executable, __file__, '--child', fmt, path, user_id])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rolls', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3, help="cold starts per format (best is reported)")
+    parser.add_argument('--child', nargs=3, metavar=('FORMAT', 'PATH', 'USER_ID'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'rolls':>9} {'format':>9} {'size MB':>9} {'load ms':>9} {'1st user ms':>12} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rolls in args.rolls:
+            data = synthetic_data(rolls)
+            user_id = next(iter(data['users']))
+            owners = OwnershipIndex()
+            owners.rebuild(data['users'])
+
+            json_path = os.path.join(tmp, f'{rolls}.json')
+            with open(json_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            snapshot_path = os.path.join(tmp, f'{rolls}.snap')
+            write_snapshot(snapshot_path, data, {'owners': owners.dump()})
+            del data, owners
+
+            baseline = run_child('none', json_path, user_id)['rss_kb']
+            for fmt, path in (('json', json_path), ('snapshot', snapshot_path)):
+                runs = [run_child(fmt, path, user_id) for _ in range(args.repeat)]
+                best = min(runs, key=lambda run: run['load'])
+                print(f"{rolls:>9} {fmt:>9} {os.path.getsize(path) / 1e6:>9.1f} {best['load'] * 1000:>9.1f} "
+                      f"{best['first_user'] * 1000:>12.2f} {(best['rss_kb'] - baseline) / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
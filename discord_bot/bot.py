@@ -1,71 +1,357 @@
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 import asyncio
 import random
 import json
 import os
 from datetime import datetime, timedelta
 import aiohttp
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 import re
+import time
+
+import export
+from dedup import Deduplicator
+from events import EventBus, GambleLogged, RollRecorded, TournamentJoined
+from indexes import OwnershipIndex, RivalryIndex
+from ledger import DEFAULT_CURRENCY, Ledger, format_amount, parse_amount
+from memory import MemorySampler, top_object_types
+from names import NameResolver
+from retention import LogCompaction, empty_summary
+from rollups import Rollups, sparkline
+from scheduler import WorkScheduler
+from snapshot import load_snapshot, prepare_snapshot, rebase_snapshot, write_prepared, write_snapshot
+from state import StateStore, new_user_record
+from tradelog import TradeLog, TradeQuery, keywords
+from pagination import ListPageSource, Page, PaginatorView
+from pokedex import PokedexIndex
+from sprites import SpriteCache
 
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix=['!', 'e!'], intents=intents)
+
+# Cache limits: MAX_MESSAGES=0 turns the message cache off; MEMBER_CACHE is
+# 'default' (whatever the intents allow), 'voice' or 'none'
+MAX_MESSAGES = int(os.getenv('MAX_MESSAGES', '1000')) or None
+MEMBER_CACHE = os.getenv('MEMBER_CACHE', 'default').lower()
+if MEMBER_CACHE == 'none':
+    member_cache_flags = discord.MemberCacheFlags.none()
+elif MEMBER_CACHE == 'voice':
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+else:
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
+bot = commands.Bot(
+    command_prefix=['!', 'e!'],
+    intents=intents,
+    help_command=None,
+    max_messages=MAX_MESSAGES,
+    member_cache_flags=member_cache_flags
+)
+names = NameResolver(bot)
 
 # Data storage
-DATA_FILE = 'ewager_data.json'
+DATA_FILE = 'ewager_data.json'  # legacy format, only read to migrate
+SNAPSHOT_FILE = 'ewager_data.snap'
+POKEAPI_BASE_URL = os.getenv('POKEAPI_BASE_URL', 'https://pokeapi.co/api/v2')
+# Seconds to wait for the one-off Pokemon name list before starting without it
+NAMES_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# Slash commands only need syncing when they change; set SYNC_COMMANDS=1 for that start (or use !sync)
+SYNC_COMMANDS = os.getenv('SYNC_COMMANDS', '').lower() in ('1', 'true', 'yes')
+POKEMON_NAMES_FILE = 'pokemon_names.json'
+POKEMON_COUNT = 1025
+SPRITE_GRID_COLUMNS = 5
+MEMORY_ALERT_CHANNEL_ID = os.getenv('MEMORY_ALERT_CHANNEL_ID')
+DEX_PAGE_SIZE = 20
+# Days of gambling logs kept for guilds without their own !retention setting (0 keeps everything)
+DEFAULT_LOG_RETENTION_DAYS = int(os.getenv('GAMBLING_LOG_RETENTION_DAYS', '0')) or None
 
 class EWagerBot:
     def __init__(self):
+        self.saved_indexes = {}
         self.data = self.load_data()
+        self.owners = OwnershipIndex()
+        if not self.owners.load(self.saved_indexes.get('owners', {})):
+            self.owners.rebuild(self.data['users'])
+        # Logs dropped by retention live on as aggregates in gambling_summary
+        self.data.setdefault('gambling_summary', empty_summary())
+        self.data.setdefault('log_retention', {})
+        self.next_log_seq = self.number_logs()
+        self.rivalries = RivalryIndex()
+        self.rivalries.rebuild(self.data['gambling_logs'], self.data['gambling_summary']['pairs'])
+        self.ledger = Ledger(self.data.setdefault('ledger', {}), self.data.setdefault('ledger_archive', {}))
+        if 'rollups' not in self.data:
+            # Data files from before rollups existed: build them once from history
+            self.rollups = Rollups(self.data.setdefault('rollups', {}))
+            self.rollups.rebuild(self.data)
+            self.save_data()
+        else:
+            self.rollups = Rollups(self.data['rollups'])
+        # Filled in with every Pokemon name by setup_hook
+        self.pokedex = PokedexIndex({})
     
     def load_data(self) -> Dict:
-        """Load bot data from file"""
+        """Load bot data from file
+
+        Snapshots are memory-mapped and user/tournament records are only
+        decoded when first accessed.
+        """
+        if os.path.exists(SNAPSHOT_FILE):
+            data, self.saved_indexes = load_snapshot(SNAPSHOT_FILE)
+            return data
         if os.path.exists(DATA_FILE):
             with open(DATA_FILE, 'r') as f:
                 return json.load(f)
         return {
             'users': {},
             'tournaments': {},
-            'gambling_logs': []
+            'gambling_logs': [],
+            'gambling_summary': empty_summary(),
+            'log_retention': {},
+            'rollups': {},
+            'ledger': {},
+            'ledger_archive': {}
         }
     
+    def number_logs(self) -> int:
+        """Give gambling logs saved before they were numbered a 'seq', returning the next one
+
+        Seqs only ever increase, so they identify a log's place in the list
+        even after retention removes older logs.
+        """
+        seq = 0
+        for log in self.data['gambling_logs']:
+            if 'seq' not in log:
+                log['seq'] = seq + 1
+            seq = log['seq']
+        return seq + 1
+    
+    def saved_indexes_dump(self) -> Dict:
+        """Derived indexes stored alongside the data so startup needn't rebuild them"""
+        return {'owners': self.owners.dump()}
+    
     def save_data(self):
-        """Save bot data to file"""
-        with open(DATA_FILE, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        """Save bot data to file, blocking until it is on disk
+
+        Only used outside the event loop (startup migration, shutdown); while
+        the bot runs, use request_save() so the write happens in a thread.
+        """
+        write_snapshot(SNAPSHOT_FILE, self.data, self.saved_indexes_dump())
     
     def get_user(self, user_id: str) -> Dict:
         """Get or create user data"""
         if user_id not in self.data['users']:
-            self.data['users'][user_id] = {
-                'id': user_id,
-                'pokemon_rolls': [],
-                'created_at': datetime.now().isoformat()
-            }
-            self.save_data()
+            self.data['users'][user_id] = new_user_record(user_id)
         return self.data['users'][user_id]
     
     async def fetch_pokemon(self, pokemon_id: int) -> Optional[Dict]:
         """Fetch Pokemon data from PokeAPI"""
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get(f'https://pokeapi.co/api/v2/pokemon/{pokemon_id}') as response:
+                async with session.get(f'{POKEAPI_BASE_URL}/pokemon/{pokemon_id}') as response:
                     if response.status == 200:
                         return await response.json()
         except Exception:
             pass
         return None
+    
+    async def load_pokemon_names(self) -> Dict[int, str]:
+        """Load every Pokemon name, from the local cache or PokeAPI"""
+        if os.path.exists(POKEMON_NAMES_FILE):
+            with open(POKEMON_NAMES_FILE, 'r') as f:
+                return {int(pokemon_id): name for pokemon_id, name in json.load(f).items()}
+        
+        try:
+            async with aiohttp.ClientSession(timeout=NAMES_FETCH_TIMEOUT) as session:
+                async with session.get(f'{POKEAPI_BASE_URL}/pokemon-species?limit={POKEMON_COUNT}') as response:
+                    if response.status == 200:
+                        results = (await response.json())['results']
+                        names = {int(r['url'].rstrip('/').split('/')[-1]): r['name'].title() for r in results}
+                        with open(POKEMON_NAMES_FILE, 'w') as f:
+                            json.dump(names, f)
+                        return names
+        except Exception:
+            pass
+        
+        # Offline: fall back to the names we've seen rolled
+        return {pokemon_id: name.title() for name, pokemon_id in self.owners.names.items()}
 
 # Initialize bot instance
 ewager = EWagerBot()
+state = StateStore(ewager.data)
+
+# Commands update ewager.data, emit an event and reply; indexes, stats and
+# saving catch up from the event bus in the background.
+bus = EventBus()
+scheduler = WorkScheduler()
+sprites = SpriteCache()
+dedup = Deduplicator(shared_path=os.getenv('CLAIMS_DB'), owner=os.getenv('INSTANCE_ID'))
+trades = TradeLog(max_segments=int(os.getenv('TRADE_LOG_MAX_SEGMENTS', '0')) or None)
+memory_sampler = MemorySampler(
+    rss_alert_mb=float(os.getenv('MEMORY_ALERT_MB', '512')),
+    growth_alert_pct=float(os.getenv('MEMORY_GROWTH_ALERT_PCT', '25')),
+    trace=os.getenv('EWAGER_TRACEMALLOC') == '1'
+)
+unsaved_changes = False
+save_task: Optional[asyncio.Task] = None
+save_writing = False
+last_save = 0.0
+saves_closed = False
+# Minimum seconds between snapshot writes; changes made meanwhile go into the next one
+SAVE_INTERVAL = float(os.getenv('SAVE_INTERVAL', '5'))
+
+def index_roll(event: RollRecorded):
+    """Update roll-derived indexes and stats"""
+    roll = event.roll
+    ewager.owners.add(event.guild_id, event.user_id, roll['id'], roll['name'])
+    ewager.rollups.record_roll(event.user_id, event.guild_id, roll['timestamp'])
+
+def index_gamble(event: GambleLogged):
+    """Update gamble-derived indexes, stats and the wager ledger"""
+    log = event.log
+    ewager.rollups.record_gamble(log['winner_id'], log['loser_id'], log['guild_id'], log['timestamp'])
+    ewager.rivalries.add(log['winner_id'], log['loser_id'], log['timestamp'])
+    if 'amount' in log:
+        log['txn'] = ewager.ledger.record_wager(log['winner_id'], log['loser_id'], log['amount'], log['currency'], log['timestamp'])
+
+def mark_unsaved(event):
+    global unsaved_changes
+    unsaved_changes = True
+
+def save_pending():
+    """Start a background save if anything changed and none is running"""
+    global save_task
+    if unsaved_changes and (save_task is None or save_task.done()):
+        save_task = asyncio.create_task(save_in_background())
+
+def request_save():
+    """Mark the data changed and make sure a background save will pick it up"""
+    global unsaved_changes
+    unsaved_changes = True
+    save_pending()
+
+async def save_in_background():
+    """Write snapshots until nothing is left unsaved, at most one per SAVE_INTERVAL
+
+    Encoding happens on the loop so the data can't change underneath it; the
+    file write and fsync run in a worker thread. The bus is settled first, so
+    the ledger, rollups and owners index saved match the logs and rolls saved
+    with them.
+    """
+    global unsaved_changes, save_writing, last_save
+    while unsaved_changes and not saves_closed:
+        await asyncio.sleep(max(0.0, last_save + SAVE_INTERVAL - time.monotonic()))
+        await bus.settle()
+        unsaved_changes = False
+        prepared = prepare_snapshot(ewager.data, ewager.saved_indexes_dump())
+        save_writing = True
+        try:
+            offsets = await scheduler.run_blocking('save', write_prepared, SNAPSHOT_FILE, prepared)
+        except Exception as e:
+            print(f"Saving data failed: {e}")
+            unsaved_changes = True
+            return
+        finally:
+            save_writing = False
+        rebase_snapshot(SNAPSHOT_FILE, ewager.data, offsets)
+        last_save = time.monotonic()
+
+async def flush_saves():
+    """Finish or replace any pending background save with a final blocking one"""
+    global unsaved_changes, saves_closed
+    saves_closed = True
+    if save_task is not None and not save_task.done():
+        if save_writing:
+            await save_task
+        else:
+            save_task.cancel()
+    if unsaved_changes:
+        unsaved_changes = False
+        ewager.save_data()
+
+bus.subscribe(RollRecorded, index_roll)
+bus.subscribe(GambleLogged, index_gamble)
+for event_type in (RollRecorded, GambleLogged, TournamentJoined):
+    bus.subscribe(event_type, mark_unsaved)
+bus.on_idle(save_pending)
+
+async def setup_hook():
+    bus.start()
+    scheduler.start()
+    ewager.pokedex = PokedexIndex(await ewager.load_pokemon_names())
+    if SYNC_COMMANDS:
+        await sync_commands()
+
+bot.setup_hook = setup_hook
+
+async def sync_commands() -> Optional[int]:
+    """Push the slash command tree to Discord, returning how many were synced (None on failure)"""
+    try:
+        synced = await bot.tree.sync()
+    except discord.HTTPException as e:
+        print(f"Slash command sync failed: {e}")
+        return None
+    print(f"Synced {len(synced)} slash commands")
+    return len(synced)
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has logged in as EWagerBot!')
     print(f'Bot is ready and serving in {len(bot.guilds)} guilds')
+    if not compact_rollups.is_running():
+        compact_rollups.start()
+    if not sample_memory.is_running():
+        sample_memory.start()
+    if not compact_logs.is_running():
+        compact_logs.start()
+
+@tasks.loop(hours=1)
+async def compact_rollups():
+    """Drop expired hourly/daily activity buckets"""
+    await scheduler.submit('compact_rollups', compact_rollups_job)
+
+@tasks.loop(hours=1)
+async def compact_logs():
+    """Fold gambling logs past their guild's retention window into the summary"""
+    await scheduler.submit('compact_logs', compact_logs_job)
+
+@tasks.loop(minutes=10)
+async def sample_memory():
+    """Record a memory sample and report threshold alerts"""
+    await scheduler.submit('sample_memory', sample_memory_job)
+
+async def sample_memory_job():
+    for alert in memory_sampler.sample(ewager, bot):
+        print(f"Memory alert: {alert}")
+        channel = bot.get_channel(int(MEMORY_ALERT_CHANNEL_ID)) if MEMORY_ALERT_CHANNEL_ID else None
+        if channel:
+            await channel.send(f"⚠️ Memory alert: {alert}")
+
+async def compact_logs_job() -> Optional[Dict]:
+    """Run one compaction pass in slices, returning its record (None if no guild has retention)"""
+    policies = ewager.data['log_retention']
+    if not DEFAULT_LOG_RETENTION_DAYS and not any(policies.values()):
+        return None
+    compaction = LogCompaction(
+        ewager.data['gambling_logs'], ewager.data['gambling_summary'], policies, DEFAULT_LOG_RETENTION_DAYS
+    )
+    for _ in compaction.chunks():
+        await scheduler.pause()
+    record = compaction.commit()
+    if record['removed']:
+        request_save()
+    return record
+
+async def compact_rollups_job():
+    removed = 0
+    for count in ewager.rollups.compact_chunks():
+        removed += count
+        await scheduler.pause()
+    if removed:
+        request_save()
 
 @bot.event
 async def on_message(message):
@@ -74,19 +360,49 @@ async def on_message(message):
         return
     
     content = message.content.lower().strip()
+    is_roll = detect_universal_roll(content) or content.startswith('e!w') or content == 'e!roll'
+    is_command = message.content.startswith(tuple(bot.command_prefix))
+    is_trade = is_trade_channel(message.channel) and not is_command
+    if not (is_roll or is_command or is_trade):
+        # Plain chat: nothing to answer or record, so nothing to claim
+        return
+    
+    # Answer each message once, even if it is redelivered or another instance sees it
+    if not await dedup.claim(f'message:{message.id}'):
+        return
+    
+    waited = (discord.utils.utcnow() - message.created_at).total_seconds()
     
-    # Universal roll command detection
-    if detect_universal_roll(content):
-        await handle_pokemon_roll(message)
+    # Universal roll command detection, including the e!w shorthand
+    if is_roll:
+        async with scheduler.interactive('roll', waited):
+            await handle_pokemon_roll(message)
         return
     
-    # e!w command detection (shorthand for Pokemon rolls)
-    if content.startswith('e!w') or content == 'e!roll':
-        await handle_pokemon_roll(message)
+    # Log trades in trade/gamble channels (bot commands aren't trade messages)
+    if is_trade:
+        log_trade_message(message)
         return
     
     # Process normal commands
-    await bot.process_commands(message)
+    async with scheduler.interactive('command', waited):
+        await bot.process_commands(message)
+
+def is_trade_channel(channel) -> bool:
+    """Check if channel is a trade or gambling channel"""
+    channel_name = getattr(channel, 'name', None) or ''
+    return 'trade' in channel_name.lower() or 'gamble' in channel_name.lower()
+
+def log_trade_message(message):
+    """Append a trade channel message to the trade log"""
+    trades.append({
+        'timestamp': datetime.now().isoformat(),
+        'guild_id': str(message.guild.id) if message.guild else None,
+        'channel_id': str(message.channel.id),
+        'user_id': str(message.author.id),
+        'message_id': str(message.id),
+        'content': message.content
+    })
 
 def detect_universal_roll(content: str) -> bool:
     """Detect Pokemon roll command patterns (1025 only, not regular 100 rolls)"""
@@ -111,8 +427,28 @@ def detect_universal_roll(content: str) -> bool:
     # Only respond to Pokemon-specific commands
     return False
 
+async def record_roll(message, user_data: Dict, pokemon_id: int, pokemon_data: Dict) -> Dict:
+    """Save a rolled Pokemon to the user's history and emit RollRecorded"""
+    roll_data = {
+        'id': pokemon_id,
+        'name': pokemon_data['name'].title(),
+        'types': [t['type']['name'].title() for t in pokemon_data['types']],
+        'height': pokemon_data['height'] / 10,  # Convert to meters
+        'weight': pokemon_data['weight'] / 10,  # Convert to kg
+        'guild_id': str(message.guild.id) if message.guild else None,
+        'timestamp': datetime.now().isoformat()
+    }
+    await state.update_user(user_data['id'], lambda user: user['pokemon_rolls'].append(roll_data))
+    await bus.emit(RollRecorded(user_data['id'], roll_data['guild_id'], roll_data))
+    return roll_data
+
 async def handle_pokemon_roll(message):
     """Handle Pokemon roll for any detected command"""
+    # One roll per message, however many triggers matched it
+    if not await dedup.claim(f'roll:{message.id}', shared=False):
+        return
+    
+    started = time.perf_counter()
     user_id = str(message.author.id)
     user_data = ewager.get_user(user_id)
     
@@ -123,33 +459,18 @@ async def handle_pokemon_roll(message):
     pokemon_data = await ewager.fetch_pokemon(pokemon_id)
     
     if pokemon_data:
-        name = pokemon_data['name'].title()
-        height = pokemon_data['height'] / 10  # Convert to meters
-        weight = pokemon_data['weight'] / 10  # Convert to kg
-        types = [t['type']['name'].title() for t in pokemon_data['types']]
+        roll_data = await record_roll(message, user_data, pokemon_id, pokemon_data)
         sprite_url = pokemon_data['sprites']['front_default']
         
-        # Save roll to user data
-        roll_data = {
-            'id': pokemon_id,
-            'name': name,
-            'types': types,
-            'height': height,
-            'weight': weight,
-            'timestamp': datetime.now().isoformat()
-        }
-        user_data['pokemon_rolls'].append(roll_data)
-        ewager.save_data()
-        
         # Create embed
         embed = discord.Embed(
             title=f"🎲 Pokemon Roll Result",
-            description=f"**{name}** (#{pokemon_id})",
+            description=f"**{roll_data['name']}** (#{pokemon_id})",
             color=0x3498db
         )
-        embed.add_field(name="Type(s)", value=" / ".join(types), inline=True)
-        embed.add_field(name="Height", value=f"{height}m", inline=True)
-        embed.add_field(name="Weight", value=f"{weight}kg", inline=True)
+        embed.add_field(name="Type(s)", value=" / ".join(roll_data['types']), inline=True)
+        embed.add_field(name="Height", value=f"{roll_data['height']}m", inline=True)
+        embed.add_field(name="Weight", value=f"{roll_data['weight']}kg", inline=True)
         
         if sprite_url:
             embed.set_thumbnail(url=sprite_url)
@@ -157,9 +478,86 @@ async def handle_pokemon_roll(message):
         embed.set_footer(text=f"Rolled by {message.author.display_name}")
         
         await message.channel.send(embed=embed)
+        bus.metrics.record('reply', 'roll', time.perf_counter() - started)
     else:
         await message.channel.send("❌ Failed to fetch Pokemon data. Please try again!")
 
+async def send_with_sprite_grid(ctx, embed: discord.Embed, pokemon_ids: List[int], urls: List[Optional[str]] = None):
+    """Send an embed with one composited image of the given Pokemon's sprites"""
+    path = await sprites.composite(pokemon_ids, SPRITE_GRID_COLUMNS, scheduler.run_cpu, urls)
+    if path is None:
+        await ctx.send(embed=embed)
+        return
+    embed.set_image(url="attachment://sprites.png")
+    await ctx.send(embed=embed, file=discord.File(path, filename="sprites.png"))
+
+@bot.command(name='multiroll')
+async def multi_roll(ctx, count: int = 10):
+    """Roll several Pokemon at once (2-10)"""
+    if count < 2 or count > 10:
+        await ctx.send("❌ You can roll between 2 and 10 Pokemon at once.")
+        return
+    
+    user_data = ewager.get_user(str(ctx.author.id))
+    pokemon_ids = [random.randint(1, 1025) for _ in range(count)]
+    results = await asyncio.gather(*(ewager.fetch_pokemon(pokemon_id) for pokemon_id in pokemon_ids))
+    
+    rolled = [(pokemon_id, data) for pokemon_id, data in zip(pokemon_ids, results) if data]
+    if not rolled:
+        await ctx.send("❌ Failed to fetch Pokemon data. Please try again!")
+        return
+    
+    lines = []
+    for i, (pokemon_id, pokemon_data) in enumerate(rolled, 1):
+        roll_data = await record_roll(ctx.message, user_data, pokemon_id, pokemon_data)
+        lines.append(f"{i}. **{roll_data['name']}** (#{pokemon_id}) - {' / '.join(roll_data['types'])}")
+    
+    embed = discord.Embed(
+        title=f"🎲 {len(rolled)}x Pokemon Roll",
+        description="\n".join(lines),
+        color=0x3498db
+    )
+    if len(rolled) < count:
+        embed.set_footer(text=f"Rolled by {ctx.author.display_name} · {count - len(rolled)} roll(s) failed")
+    else:
+        embed.set_footer(text=f"Rolled by {ctx.author.display_name}")
+    
+    await send_with_sprite_grid(
+        ctx, embed, [pokemon_id for pokemon_id, _ in rolled],
+        [data['sprites']['front_default'] for _, data in rolled]
+    )
+
+@bot.command(name='dex')
+async def dex_command(ctx, page: Optional[int] = None, user: discord.Member = None):
+    """Show the distinct Pokemon a user has rolled, a page of sprites at a time"""
+    target_user = user or ctx.author
+    if page is None:
+        page = 1
+    user_data = ewager.get_user(str(target_user.id))
+    
+    collected = {}
+    for roll in user_data['pokemon_rolls']:
+        collected.setdefault(roll['id'], roll['name'])
+    if not collected:
+        await ctx.send(f"❌ {target_user.display_name} hasn't rolled any Pokemon yet!")
+        return
+    
+    pokemon_ids = sorted(collected)
+    pages = (len(pokemon_ids) + DEX_PAGE_SIZE - 1) // DEX_PAGE_SIZE
+    if page < 1 or page > pages:
+        await ctx.send(f"❌ Page must be between 1 and {pages}.")
+        return
+    
+    shown = pokemon_ids[(page - 1) * DEX_PAGE_SIZE:page * DEX_PAGE_SIZE]
+    embed = discord.Embed(
+        title=f"📚 {target_user.display_name}'s Pokedex",
+        description=" · ".join(f"#{pokemon_id} {collected[pokemon_id]}" for pokemon_id in shown),
+        color=0x9b59b6
+    )
+    embed.set_footer(text=f"Page {page}/{pages} · {len(pokemon_ids)}/{POKEMON_COUNT} collected")
+    
+    await send_with_sprite_grid(ctx, embed, shown)
+
 @bot.command(name='roll')
 async def roll_pokemon_command(ctx, *args):
     """Roll a random Pokemon (1-1025) via command - only responds to Pokemon rolls"""
@@ -188,34 +586,127 @@ async def roll_number(ctx):
 
 @bot.command(name='recent')
 async def recent_rolls(ctx, limit: int = 5):
-    """Show recent Pokemon rolls"""
+    """Show recent Pokemon rolls, a page at a time"""
     user_id = str(ctx.author.id)
     user_data = ewager.get_user(user_id)
     
-    rolls = user_data['pokemon_rolls'][-limit:]
-    
-    if not rolls:
+    if not user_data['pokemon_rolls']:
         await ctx.send("❌ You haven't rolled any Pokemon yet! Use `!roll` to get started.")
         return
     
+    async def render(page: Page) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"🗂️ Recent Pokemon Rolls",
+            description="Your Pokemon rolls, newest first:",
+            color=0x9b59b6
+        )
+        
+        for i, roll in enumerate(page.items, page.first_number):
+            types_str = " / ".join(roll['types'])
+            embed.add_field(
+                name=f"{i}. {roll['name']} (#{roll['id']})",
+                value=f"Type: {types_str}",
+                inline=False
+            )
+        
+        embed.set_footer(text=f"Showing {page.first_number}-{page.first_number + len(page.items) - 1} of {page.total} rolls")
+        return embed
+    
+    source = ListPageSource(user_data['pokemon_rolls'], per_page=limit)
+    await PaginatorView(source, render, ctx.author.id).send(ctx)
+
+async def pokemon_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Suggest Pokemon names as the user types"""
+    return [
+        app_commands.Choice(name=f"#{pokemon_id} {name}", value=name)
+        for pokemon_id, name in ewager.pokedex.search(current)
+    ]
+
+@bot.tree.command(name='pokedex', description="Look up a Pokemon")
+@app_commands.describe(pokemon="Pokemon name or number")
+@app_commands.autocomplete(pokemon=pokemon_autocomplete)
+async def pokedex_command(interaction: discord.Interaction, pokemon: str):
+    """Show a Pokemon's details"""
+    pokemon_id = ewager.pokedex.resolve(pokemon)
+    if pokemon_id is None:
+        suggestions = ewager.pokedex.search(pokemon, limit=3)
+        hint = f" Did you mean {', '.join(name for _, name in suggestions)}?" if suggestions else ""
+        await interaction.response.send_message(f"❌ No Pokemon called **{pokemon}**.{hint}", ephemeral=True)
+        return
+    
+    await interaction.response.defer()
+    pokemon_data = await ewager.fetch_pokemon(pokemon_id)
+    if not pokemon_data:
+        await interaction.followup.send("❌ Failed to fetch Pokemon data. Please try again!")
+        return
+    
+    types = [t['type']['name'].title() for t in pokemon_data['types']]
+    owners = ewager.owners.who_has(interaction.guild_id, pokemon_id)
+    
     embed = discord.Embed(
-        title=f"🗂️ Recent Pokemon Rolls",
-        description=f"Your last {len(rolls)} Pokemon rolls:",
-        color=0x9b59b6
+        title=f"📖 {pokemon_data['name'].title()}",
+        description=f"Pokedex #{pokemon_id}",
+        color=0xe74c3c
     )
+    embed.add_field(name="Type(s)", value=" / ".join(types), inline=True)
+    embed.add_field(name="Height", value=f"{pokemon_data['height'] / 10}m", inline=True)
+    embed.add_field(name="Weight", value=f"{pokemon_data['weight'] / 10}kg", inline=True)
+    embed.add_field(name="Owners here", value=len(owners), inline=True)
+    if pokemon_data['sprites']['front_default']:
+        embed.set_thumbnail(url=pokemon_data['sprites']['front_default'])
     
-    for i, roll in enumerate(reversed(rolls), 1):
-        types_str = " / ".join(roll['types'])
-        embed.add_field(
-            name=f"{i}. {roll['name']} (#{roll['id']})",
-            value=f"Type: {types_str}",
-            inline=False
-        )
+    await interaction.followup.send(embed=embed)
+
+@bot.hybrid_command(name='whohas', description="See who in this server has rolled a Pokemon")
+@app_commands.describe(query="Pokemon name or number")
+@app_commands.autocomplete(query=pokemon_autocomplete)
+async def who_has(ctx, *, query: str = None):
+    """Show which users in this server have rolled a Pokemon"""
+    if not query:
+        await ctx.send("❌ Please specify a Pokemon name or ID. Usage: `!whohas <name|id>`")
+        return
+    
+    pokemon_id = ewager.pokedex.resolve(query)
+    if pokemon_id is None:
+        pokemon_id = ewager.owners.resolve(query)
+    if pokemon_id is None:
+        await ctx.send(f"❌ Nobody has rolled a Pokemon called **{query}** yet.")
+        return
     
-    embed.set_footer(text=f"Total rolls: {len(user_data['pokemon_rolls'])}")
+    owners = ewager.owners.who_has(ctx.guild.id if ctx.guild else None, pokemon_id)
+    if not owners:
+        await ctx.send(f"❌ Nobody in this server has rolled {ewager.pokedex.names.get(pokemon_id, 'Pokemon')} (#{pokemon_id}) yet.")
+        return
+    
+    shown = owners[:25]
+    lines = [f"<@{user_id}> - {count} roll{'s' if count != 1 else ''}" for user_id, count in shown]
+    
+    embed = discord.Embed(
+        title=f"🔎 Who has {ewager.pokedex.names.get(pokemon_id, 'Pokemon')} (#{pokemon_id})?",
+        description="\n".join(lines),
+        color=0x1abc9c
+    )
+    if len(owners) > len(shown):
+        embed.set_footer(text=f"Showing {len(shown)} of {len(owners)} owners")
+    else:
+        embed.set_footer(text=f"{len(owners)} owner{'s' if len(owners) != 1 else ''}")
     
     await ctx.send(embed=embed)
 
+JOIN_ERRORS = {
+    'not_found': "❌ Tournament not found.",
+    'closed': "❌ This tournament is not accepting new participants.",
+    'already_joined': "❌ You're already registered for this tournament.",
+    'full': "❌ This tournament is full."
+}
+
+START_ERRORS = {
+    'not_found': "❌ Tournament not found.",
+    'not_creator': "❌ Only the tournament creator can start it.",
+    'closed': "❌ This tournament has already started or ended.",
+    'too_few': "❌ Need at least 4 participants to start the tournament."
+}
+
 @bot.command(name='tournament')
 async def tournament_command(ctx, action: str = None, *, args: str = None):
     """Tournament management commands"""
@@ -258,19 +749,9 @@ async def tournament_command(ctx, action: str = None, *, args: str = None):
             await ctx.send("❌ Please provide a valid number for tournament size.")
             return
         
-        tournament_id = f"tournament_{len(ewager.data['tournaments']) + 1}"
-        tournament = {
-            'id': tournament_id,
-            'creator': str(ctx.author.id),
-            'size': size,
-            'participants': [],
-            'status': 'registration',
-            'created_at': datetime.now().isoformat(),
-            'winner': None
-        }
-        
-        ewager.data['tournaments'][tournament_id] = tournament
-        ewager.save_data()
+        tournament = await state.create_tournament(str(ctx.author.id), size)
+        tournament_id = tournament['id']
+        request_save()
         
         embed = discord.Embed(
             title="🏆 Tournament Created!",
@@ -285,32 +766,21 @@ async def tournament_command(ctx, action: str = None, *, args: str = None):
         await ctx.send(embed=embed)
     
     elif action == "join":
+        started = time.perf_counter()
         if not args:
             await ctx.send("❌ Please specify a tournament ID.")
             return
         
         tournament_id = args.strip()
-        if tournament_id not in ewager.data['tournaments']:
-            await ctx.send("❌ Tournament not found.")
-            return
-        
-        tournament = ewager.data['tournaments'][tournament_id]
         user_id = str(ctx.author.id)
         
-        if tournament['status'] != 'registration':
-            await ctx.send("❌ This tournament is not accepting new participants.")
+        # Checked and joined under the tournament's lock so it can't be overfilled
+        tournament, error = await state.join_tournament(tournament_id, user_id)
+        if error:
+            await ctx.send(JOIN_ERRORS[error])
             return
         
-        if user_id in tournament['participants']:
-            await ctx.send("❌ You're already registered for this tournament.")
-            return
-        
-        if len(tournament['participants']) >= tournament['size']:
-            await ctx.send("❌ This tournament is full.")
-            return
-        
-        tournament['participants'].append(user_id)
-        ewager.save_data()
+        await bus.emit(TournamentJoined(tournament_id, user_id))
         
         embed = discord.Embed(
             title="🎯 Joined Tournament!",
@@ -324,6 +794,7 @@ async def tournament_command(ctx, action: str = None, *, args: str = None):
         )
         
         await ctx.send(embed=embed)
+        bus.metrics.record('reply', 'tournament_join', time.perf_counter() - started)
     
     elif action == "list":
         tournaments = ewager.data['tournaments']
@@ -354,33 +825,17 @@ async def tournament_command(ctx, action: str = None, *, args: str = None):
             return
         
         tournament_id = args.strip()
-        if tournament_id not in ewager.data['tournaments']:
-            await ctx.send("❌ Tournament not found.")
-            return
-        
-        tournament = ewager.data['tournaments'][tournament_id]
         
-        if tournament['creator'] != str(ctx.author.id):
-            await ctx.send("❌ Only the tournament creator can start it.")
-            return
-        
-        if tournament['status'] != 'registration':
-            await ctx.send("❌ This tournament has already started or ended.")
-            return
-        
-        if len(tournament['participants']) < 4:
-            await ctx.send("❌ Need at least 4 participants to start the tournament.")
+        # Randomly select a winner for now (in a real bot, you'd implement proper tournament logic)
+        tournament, error = await state.complete_tournament(tournament_id, str(ctx.author.id), random.choice)
+        if error:
+            await ctx.send(START_ERRORS[error])
             return
         
-        # Randomly select a winner for now (in a real bot, you'd implement proper tournament logic)
-        winner_id = random.choice(tournament['participants'])
-        tournament['status'] = 'completed'
-        tournament['winner'] = winner_id
-        tournament['completed_at'] = datetime.now().isoformat()
-        ewager.save_data()
+        winner_id = tournament['winner']
+        request_save()
         
-        winner_user = bot.get_user(int(winner_id))
-        winner_name = winner_user.display_name if winner_user else f"User {winner_id}"
+        winner_name = await names.resolve(winner_id, ctx.guild)
         
         embed = discord.Embed(
             title="🏆 Tournament Complete!",
@@ -393,7 +848,8 @@ async def tournament_command(ctx, action: str = None, *, args: str = None):
         await ctx.send(embed=embed)
 
 @bot.command(name='gamble')
-async def gamble_command(ctx, action: str = None, winner: discord.Member = None, loser: discord.Member = None):
+async def gamble_command(ctx, action: str = None, winner: discord.Member = None, loser: discord.Member = None,
+                         amount: str = None, *, currency: str = DEFAULT_CURRENCY):
     """Log gambling results between users"""
     if action is None or action != "log":
         embed = discord.Embed(
@@ -402,14 +858,15 @@ async def gamble_command(ctx, action: str = None, winner: discord.Member = None,
             color=0xe67e22
         )
         embed.add_field(
-            name="!gamble log @winner @loser",
-            value="Log a gambling result between two users",
+            name="!gamble log @winner @loser [amount] [currency]",
+            value="Log a gambling result between two users, optionally with the amount wagered",
             inline=False
         )
         await ctx.send(embed=embed)
         return
     
     if action == "log":
+        started = time.perf_counter()
         if not winner or not loser:
             await ctx.send("❌ Please mention both winner and loser. Usage: `!gamble log @winner @loser`")
             return
@@ -418,15 +875,30 @@ async def gamble_command(ctx, action: str = None, winner: discord.Member = None,
             await ctx.send("❌ Winner and loser cannot be the same person.")
             return
         
+        if amount is not None:
+            wager = parse_amount(amount)
+            if wager is None:
+                await ctx.send("❌ The wager amount must be a positive number.")
+                return
+        else:
+            wager = None
+        currency = currency.strip().lower()
+        
         log_entry = {
+            'seq': ewager.next_log_seq,
             'winner_id': str(winner.id),
             'loser_id': str(loser.id),
             'logged_by': str(ctx.author.id),
+            'guild_id': str(ctx.guild.id) if ctx.guild else None,
             'timestamp': datetime.now().isoformat()
         }
+        if wager is not None:
+            log_entry['amount'] = wager
+            log_entry['currency'] = currency
         
+        ewager.next_log_seq += 1
         ewager.data['gambling_logs'].append(log_entry)
-        ewager.save_data()
+        await bus.emit(GambleLogged(log_entry))
         
         embed = discord.Embed(
             title="🎰 Gambling Result Logged",
@@ -436,58 +908,327 @@ async def gamble_command(ctx, action: str = None, winner: discord.Member = None,
         embed.add_field(name="Winner", value=winner.mention, inline=True)
         embed.add_field(name="Loser", value=loser.mention, inline=True)
         embed.add_field(name="Logged by", value=ctx.author.mention, inline=True)
+        if wager is not None:
+            embed.add_field(name="Wager", value=format_amount(wager, currency), inline=True)
         
         await ctx.send(embed=embed)
+        bus.metrics.record('reply', 'gamble', time.perf_counter() - started)
 
-@bot.command(name='logs')
-async def gambling_logs(ctx, limit: int = 10):
-    """Show recent gambling logs"""
-    logs = ewager.data['gambling_logs'][-limit:]
+@bot.command(name='balance')
+async def balance_command(ctx, user: discord.Member = None):
+    """Show a user's wager winnings and outstanding amounts"""
+    target_user = user or ctx.author
+    user_id = str(target_user.id)
     
-    if not logs:
-        await ctx.send("❌ No gambling logs found.")
+    balance = ewager.ledger.balance(user_id)
+    outstanding = ewager.ledger.outstanding(user_id)
+    
+    embed = discord.Embed(
+        title=f"💰 Balance for {target_user.display_name}",
+        color=0xf1c40f
+    )
+    embed.add_field(
+        name="Net Winnings",
+        value="\n".join(format_amount(amount, currency) for currency, amount in sorted(balance.items())) or "Nothing wagered yet",
+        inline=False
+    )
+    
+    owed_to = [f"<@{other_id}> owes {format_amount(amount, currency)}" for other_id, currency, amount in outstanding if amount > 0]
+    owes = [f"Owes <@{other_id}> {format_amount(-amount, currency)}" for other_id, currency, amount in outstanding if amount < 0]
+    embed.add_field(name="Owed to them", value="\n".join(owed_to[:15]) or "Nothing", inline=True)
+    embed.add_field(name="They owe", value="\n".join(owes[:15]) or "Nothing", inline=True)
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='settle')
+async def settle_command(ctx, user: discord.Member = None, action: str = None):
+    """Show or settle what is owed between you and another user"""
+    if not user or user.id == ctx.author.id:
+        await ctx.send("❌ Please mention another user. Usage: `!settle @user [confirm]`")
+        return
+    
+    author_id, other_id = str(ctx.author.id), str(user.id)
+    owed = ewager.ledger.owed(author_id, other_id)
+    if not owed:
+        await ctx.send(f"✅ You and {user.display_name} are all square.")
+        return
+    
+    if action != "confirm":
+        lines = []
+        for currency, amount in sorted(owed.items()):
+            if amount > 0:
+                lines.append(f"{user.mention} owes you {format_amount(amount, currency)}")
+            else:
+                lines.append(f"You owe {user.mention} {format_amount(-amount, currency)}")
+        embed = discord.Embed(
+            title="🤝 Settle Up",
+            description="\n".join(lines),
+            color=0xf1c40f
+        )
+        embed.set_footer(text="Once paid, the person owed can run !settle @user confirm")
+        await ctx.send(embed=embed)
+        return
+    
+    # Re-read under both users' locks so two confirms can't settle the same debt twice
+    async with state.user_lock(author_id, other_id):
+        # Only the person owed can mark a debt as paid
+        owed = ewager.ledger.owed(author_id, other_id)
+        to_settle = {currency: amount for currency, amount in owed.items() if amount > 0}
+        if to_settle:
+            timestamp = datetime.now().isoformat()
+            for currency, amount in to_settle.items():
+                ewager.ledger.record_settlement(other_id, author_id, amount, currency, timestamp)
+            request_save()
+    
+    if not to_settle:
+        await ctx.send(f"❌ {user.display_name} doesn't owe you anything. Only the person owed can confirm a settlement.")
+        return
+    
+    settled = ", ".join(format_amount(amount, currency) for currency, amount in sorted(to_settle.items()))
+    await ctx.send(f"✅ Marked {settled} from {user.mention} as paid.")
+
+@bot.command(name='h2h')
+async def head_to_head(ctx, user_a: discord.Member = None, user_b: discord.Member = None):
+    """Show the gambling record between two users"""
+    if not user_a:
+        await ctx.send("❌ Please mention at least one user. Usage: `!h2h @user1 [@user2]`")
         return
     
+    if not user_b:
+        user_a, user_b = ctx.author, user_a
+    
+    if user_a.id == user_b.id:
+        await ctx.send("❌ Please mention two different users.")
+        return
+    
+    a_id, b_id = str(user_a.id), str(user_b.id)
+    record = ewager.rivalries.head_to_head(a_id, b_id)
+    if not record:
+        await ctx.send(f"❌ {user_a.display_name} and {user_b.display_name} have no logged results against each other.")
+        return
+    
+    a_wins, b_wins = record['wins'][a_id], record['wins'][b_id]
+    last_winner = user_a if record['last_winner'] == a_id else user_b
+    streak_holder = user_a if record['streak_holder'] == a_id else user_b
+    last_played = datetime.fromisoformat(record['last_timestamp'])
+    
     embed = discord.Embed(
-        title="🎰 Recent Gambling Results",
-        description=f"Last {len(logs)} gambling results:",
+        title="⚔️ Head to Head",
+        description=f"**{user_a.display_name}** {a_wins} - {b_wins} **{user_b.display_name}**",
         color=0xe67e22
     )
+    embed.add_field(name="Games", value=a_wins + b_wins, inline=True)
+    embed.add_field(name="Last Winner", value=last_winner.mention, inline=True)
+    embed.add_field(name="Streak", value=f"{streak_holder.mention} x{record['streak']}", inline=True)
+    embed.set_footer(text=f"Last played {last_played.strftime('%Y-%m-%d %H:%M')}")
     
-    for i, log in enumerate(reversed(logs), 1):
-        winner_user = bot.get_user(int(log['winner_id']))
-        loser_user = bot.get_user(int(log['loser_id']))
+    await ctx.send(embed=embed)
+
+@bot.command(name='logs')
+async def gambling_logs(ctx, limit: int = 10):
+    """Show recent gambling logs, a page at a time"""
+    if not ewager.data['gambling_logs']:
+        await ctx.send("❌ No gambling logs found.")
+        return
+    
+    async def render(page: Page) -> discord.Embed:
+        embed = discord.Embed(
+            title="🎰 Recent Gambling Results",
+            description="Gambling results, newest first:",
+            color=0xe67e22
+        )
         
-        winner_name = winner_user.display_name if winner_user else f"User {log['winner_id'][:8]}..."
-        loser_name = loser_user.display_name if loser_user else f"User {log['loser_id'][:8]}..."
+        # Resolve every name shown on this page in one batch
+        user_names = await names.resolve_many(
+            [log['winner_id'] for log in page.items] + [log['loser_id'] for log in page.items],
+            ctx.guild
+        )
+        
+        for i, log in enumerate(page.items, page.first_number):
+            winner_name = user_names[log['winner_id']]
+            loser_name = user_names[log['loser_id']]
+            
+            timestamp = datetime.fromisoformat(log['timestamp'])
+            
+            embed.add_field(
+                name=f"{i}. {winner_name} vs {loser_name}",
+                value=f"Winner: {winner_name}\nDate: {timestamp.strftime('%Y-%m-%d %H:%M')}",
+                inline=False
+            )
+        
+        embed.set_footer(text=f"Showing {page.first_number}-{page.first_number + len(page.items) - 1} of {page.total} results")
+        return embed
+    
+    # Keyed by seq: retention can remove logs while the pages are open
+    source = ListPageSource(ewager.data['gambling_logs'], per_page=limit, key=lambda log: log['seq'])
+    await PaginatorView(source, render, ctx.author.id).send(ctx)
+
+@bot.command(name='tradelog')
+async def trade_log(ctx, *args):
+    """Search this server's logged trade channel messages by user, channel, date and keywords"""
+    if ctx.guild is None:
+        await ctx.send("❌ The trade log can only be searched in a server.")
+        return
+    
+    user = ctx.message.mentions[0] if ctx.message.mentions else None
+    channel_mentions = getattr(ctx.message, 'channel_mentions', [])
+    channel = channel_mentions[0] if channel_mentions else None
+    
+    since = None
+    words = []
+    for arg in args:
+        if arg.startswith('<') and arg.endswith('>'):
+            continue
+        if arg.startswith('days:'):
+            try:
+                since = (datetime.now() - timedelta(days=int(arg[5:]))).isoformat()
+            except ValueError:
+                await ctx.send("❌ Days must be a number, e.g. `days:7`.")
+                return
+        else:
+            words.append(arg)
+    
+    query = TradeQuery(
+        guild_id=str(ctx.guild.id),
+        channel_id=str(channel.id) if channel else None,
+        user_id=str(user.id) if user else None,
+        since=since,
+        words=frozenset(keywords(' '.join(words)))
+    )
+    if not (user or channel or query.words):
+        await ctx.send("❌ Usage: `!tradelog [@user] [#channel] [days:N] [keywords...]` (keywords are whole words of 3+ letters)")
+        return
+    
+    async with ctx.typing():
+        results = await scheduler.run_blocking('tradelog', TradeLog.search, trades.plan(query), query)
+    
+    if not results:
+        await ctx.send("❌ No logged trade messages matched.")
+        return
+    
+    description = "Trade messages"
+    if user:
+        description += f" from {user.display_name}"
+    if query.words:
+        description += f" mentioning {', '.join(sorted(query.words))}"
+    
+    async def render(page: Page) -> discord.Embed:
+        embed = discord.Embed(
+            title="🔁 Trade Log",
+            description=f"{description}, newest first:",
+            color=0x1abc9c
+        )
+        user_names = await names.resolve_many([entry['user_id'] for entry in page.items], ctx.guild)
         
-        timestamp = datetime.fromisoformat(log['timestamp'])
+        for i, entry in enumerate(page.items, page.first_number):
+            timestamp = datetime.fromisoformat(entry['timestamp'])
+            content = entry['content'] if len(entry['content']) <= 200 else entry['content'][:197] + '...'
+            embed.add_field(
+                name=f"{i}. {user_names[entry['user_id']]} in <#{entry['channel_id']}>"[:256],
+                value=f"{content or '(no text)'}\n{timestamp.strftime('%Y-%m-%d %H:%M')}",
+                inline=False
+            )
         
+        embed.set_footer(text=f"Showing {page.first_number}-{page.first_number + len(page.items) - 1} of {page.total} results")
+        return embed
+    
+    source = ListPageSource(results, per_page=5)
+    await PaginatorView(source, render, ctx.author.id).send(ctx)
+
+@bot.command(name='export')
+async def export_command(ctx, kind: str = None, *args):
+    """Export gambling logs or Pokemon rolls as a compressed file (admin only)"""
+    if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Only server administrators can export data.")
+        return
+    
+    if kind not in ('logs', 'rolls'):
+        embed = discord.Embed(
+            title="📦 Export Commands",
+            description="Export data as a gzip-compressed CSV or JSONL file:",
+            color=0x95a5a6
+        )
         embed.add_field(
-            name=f"{i}. {winner_name} vs {loser_name}",
-            value=f"Winner: {winner_name}\nDate: {timestamp.strftime('%Y-%m-%d %H:%M')}",
+            name="!export <logs|rolls> [csv|jsonl] [since:YYYY-MM-DD] [until:YYYY-MM-DD] [days:N] [@user]",
+            value="Export this server's gambling logs or Pokemon rolls, optionally filtered by date range and user",
             inline=False
         )
+        await ctx.send(embed=embed)
+        return
     
-    await ctx.send(embed=embed)
+    fmt = 'csv'
+    since = until = None
+    try:
+        for arg in args:
+            if arg.lower() in export.FORMATS:
+                fmt = arg.lower()
+            elif arg.startswith('since:'):
+                since = datetime.fromisoformat(arg[6:]).isoformat()
+            elif arg.startswith('until:'):
+                until = datetime.fromisoformat(arg[6:]).isoformat()
+            elif arg.startswith('days:'):
+                since = (datetime.now() - timedelta(days=int(arg[5:]))).isoformat()
+    except ValueError:
+        await ctx.send("❌ Invalid filter. Dates must look like `2024-01-31` and days must be a number.")
+        return
+    
+    user_id = str(ctx.message.mentions[0].id) if ctx.message.mentions else None
+    # Only this server's rows; DM and pre-guild-tracking rows are never exported
+    guild_id = str(ctx.guild.id)
+    
+    if kind == 'logs':
+        rows = export.iter_gambling_logs(list(ewager.data['gambling_logs']), guild_id, since, until, user_id)
+        fields = export.LOG_FIELDS
+    else:
+        rows = export.iter_pokemon_rolls(export.select_users(ewager.data['users'], user_id), guild_id, since, until)
+        fields = export.ROLL_FIELDS
+    
+    async with ctx.typing():
+        path, count = await scheduler.run_blocking('export', export.export_to_tempfile, rows, fields, fmt)
+    
+    try:
+        if count == 0:
+            await ctx.send("❌ No records matched those filters.")
+            return
+        
+        if os.path.getsize(path) > ctx.guild.filesize_limit:
+            await ctx.send("❌ The export is too large to upload here. Try a narrower date range.")
+            return
+        
+        filename = f"ewager_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}.gz"
+        await ctx.send(
+            f"📦 Exported {count} {'gambling logs' if kind == 'logs' else 'Pokemon rolls'}",
+            file=discord.File(path, filename=filename)
+        )
+    finally:
+        os.remove(path)
+
+STATS_PERIODS = {'day': 1, 'week': 7, 'month': 30}
 
 @bot.command(name='stats')
-async def user_stats(ctx, user: discord.Member = None):
-    """Show user statistics"""
+async def user_stats(ctx, period: Optional[Literal['day', 'week', 'month']] = None, user: discord.Member = None):
+    """Show user statistics, lifetime or for the last day/week/month"""
     target_user = user or ctx.author
     user_id = str(target_user.id)
     user_data = ewager.get_user(user_id)
     
-    # Calculate gambling stats
-    gambling_logs = ewager.data['gambling_logs']
-    wins = len([log for log in gambling_logs if log['winner_id'] == user_id])
-    losses = len([log for log in gambling_logs if log['loser_id'] == user_id])
+    if period:
+        totals = ewager.rollups.window('users', user_id, STATS_PERIODS[period])
+        rolls = totals.get('rolls', 0)
+        wins = totals.get('wins', 0)
+        losses = totals.get('losses', 0)
+        title = f"📊 Stats for {target_user.display_name} (last {period})"
+    else:
+        # Lifetime gambling stats, including logs compacted away by retention
+        rolls = len(user_data['pokemon_rolls'])
+        wins, losses = ewager.rivalries.totals(user_id)
+        title = f"📊 Stats for {target_user.display_name}"
     
     embed = discord.Embed(
-        title=f"📊 Stats for {target_user.display_name}",
+        title=title,
         color=0x9b59b6
     )
-    embed.add_field(name="Pokemon Rolls", value=len(user_data['pokemon_rolls']), inline=True)
+    embed.add_field(name="Pokemon Rolls", value=rolls, inline=True)
     embed.add_field(name="Gambling Wins", value=wins, inline=True)
     embed.add_field(name="Gambling Losses", value=losses, inline=True)
     
@@ -499,10 +1240,267 @@ async def user_stats(ctx, user: discord.Member = None):
             inline=False
         )
     
+    rivals = ewager.rivalries.top_rivals(user_id)
+    if rivals:
+        lines = []
+        for opponent_id, games in rivals:
+            record = ewager.rivalries.head_to_head(user_id, opponent_id)
+            lines.append(f"<@{opponent_id}> - {record['wins'][user_id]}W / {record['wins'][opponent_id]}L")
+        embed.add_field(name="Top Rivals", value="\n".join(lines), inline=False)
+    
     embed.set_thumbnail(url=target_user.avatar.url if target_user.avatar else None)
     
     await ctx.send(embed=embed)
 
+@bot.command(name='activity')
+async def activity_command(ctx, user: discord.Member = None):
+    """Show a user's roll and gambling activity over the last day and week"""
+    target_user = user or ctx.author
+    user_id = str(target_user.id)
+    
+    hours = ewager.rollups.hourly('users', user_id, 24)
+    days = ewager.rollups.daily('users', user_id, 7)
+    
+    embed = discord.Embed(
+        title=f"📈 Activity for {target_user.display_name}",
+        color=0x9b59b6
+    )
+    embed.add_field(
+        name="Rolls, last 24 hours",
+        value=f"`{sparkline([bucket.get('rolls', 0) for _, bucket in hours])}` {sum(bucket.get('rolls', 0) for _, bucket in hours)} total",
+        inline=False
+    )
+    embed.add_field(
+        name="Rolls, last 7 days",
+        value=f"`{sparkline([bucket.get('rolls', 0) for _, bucket in days])}` {sum(bucket.get('rolls', 0) for _, bucket in days)} total",
+        inline=False
+    )
+    embed.add_field(
+        name="Gambles, last 7 days",
+        value=f"{sum(bucket.get('wins', 0) for _, bucket in days)} wins / {sum(bucket.get('losses', 0) for _, bucket in days)} losses",
+        inline=False
+    )
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='trends')
+async def server_trends(ctx):
+    """Show this server's roll and gambling trends"""
+    if ctx.guild is None:
+        await ctx.send("❌ Server trends are only available in a server.")
+        return
+    
+    guild_id = str(ctx.guild.id)
+    days = ewager.rollups.daily('guilds', guild_id, 14)
+    previous_week, this_week = days[:7], days[7:]
+    
+    embed = discord.Embed(
+        title=f"📈 Trends for {ctx.guild.name}",
+        description="Activity over the last 14 days",
+        color=0x1abc9c
+    )
+    for metric, label in (('rolls', "Pokemon Rolls"), ('gambles', "Gambling Results")):
+        current = sum(bucket.get(metric, 0) for _, bucket in this_week)
+        previous = sum(bucket.get(metric, 0) for _, bucket in previous_week)
+        if previous:
+            change = f"{(current - previous) * 100 / previous:+.0f}% vs previous week"
+        else:
+            change = "no activity the previous week"
+        embed.add_field(
+            name=label,
+            value=f"`{sparkline([bucket.get(metric, 0) for _, bucket in days])}`\n{current} this week ({change})",
+            inline=False
+        )
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='latency')
+async def latency_command(ctx):
+    """Show reply latency versus background processing latency"""
+    rows = bus.metrics.summary()
+    
+    embed = discord.Embed(
+        title="⏱️ Latency",
+        description=f"Gateway: {bot.latency * 1000:.0f}ms · Event queue depth: {bus.depth}",
+        color=0x95a5a6
+    )
+    for kind, label in (('reply', "Reply time"), ('processing', "Background processing")):
+        lines = [f"`{name}` p50 {p50:.1f}ms · p99 {p99:.1f}ms ({count})" for k, name, count, p50, p99 in rows if k == kind]
+        embed.add_field(name=label, value="\n".join(lines) or "No samples yet", inline=False)
+    
+    lanes = []
+    for lane, depth, p50, p99 in scheduler.summary():
+        wait = f"wait p50 {p50:.1f}ms · p99 {p99:.1f}ms" if p50 is not None else "no waits yet"
+        lanes.append(f"`{lane}` depth {depth} · {wait}")
+    embed.add_field(name="Work lanes", value="\n".join(lanes), inline=False)
+    
+    stats = dedup.stats
+    embed.add_field(
+        name="Deduplication",
+        value=f"{stats['claimed']} handled · {stats['duplicate']} repeats dropped · "
+              f"{stats['other_instance']} answered by another instance",
+        inline=False
+    )
+    
+    await ctx.send(embed=embed)
+
+async def report_compaction(ctx, future: asyncio.Future):
+    """Post the outcome of a compaction pass started with !retention run"""
+    try:
+        record = await future
+    except Exception as e:
+        await ctx.send(f"❌ Compaction failed: {e}")
+        return
+    if record is None:
+        await ctx.send("❌ No server has a retention window set, so there is nothing to compact.")
+        return
+    await ctx.send(
+        f"🧹 Compacted {record['removed']:,} of {record['scanned']:,} logs "
+        f"({record['bytes'] / 1024:,.1f}KB reclaimed) in {record['seconds']:.2f}s."
+    )
+
+@bot.command(name='retention')
+async def retention_command(ctx, setting: str = None):
+    """Show or change how long this server's gambling logs are kept (admin only)"""
+    if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Only server administrators can manage log retention.")
+        return
+    
+    guild_id = str(ctx.guild.id)
+    policies = ewager.data['log_retention']
+    summary = ewager.data['gambling_summary']
+    
+    if setting == "run":
+        # The pass yields to interactive handlers, this one included, so report back once it is done
+        future = await scheduler.submit('compact_logs', compact_logs_job)
+        await ctx.send("🧹 Compaction queued. The result will be posted here when it finishes.")
+        asyncio.create_task(report_compaction(ctx, future))
+        return
+    
+    if setting is not None:
+        if setting == "default":
+            policies.pop(guild_id, None)
+        elif setting == "off":
+            policies[guild_id] = 0
+        elif setting.isdigit() and int(setting) > 0:
+            policies[guild_id] = int(setting)
+        else:
+            await ctx.send("❌ Usage: `!retention [days|off|default|run]`")
+            return
+        request_save()
+    
+    days = policies.get(guild_id, DEFAULT_LOG_RETENTION_DAYS)
+    embed = discord.Embed(
+        title="🧹 Gambling Log Retention",
+        description=(f"Logs older than **{days} days** are folded into lifetime totals" if days
+                     else "Logs are kept forever") + (" (server default)" if guild_id not in policies else ""),
+        color=0x95a5a6
+    )
+    
+    compacted = summary['guilds'].get(guild_id)
+    if compacted:
+        embed.add_field(
+            name="Compacted so far",
+            value=f"{compacted['entries']:,} logs from {compacted['first_timestamp'][:10]} to {compacted['last_timestamp'][:10]}",
+            inline=False
+        )
+    
+    passes = [record for record in summary['passes'] if record['removed'] or record is summary['passes'][-1]][-5:]
+    if passes:
+        embed.add_field(
+            name="Recent passes",
+            value="\n".join(
+                f"{record['timestamp'][:16].replace('T', ' ')}: {record['removed']:,} logs "
+                f"({record['bytes'] / 1024:,.1f}KB) reclaimed in {record['seconds']:.2f}s, {record['remaining']:,} left"
+                for record in reversed(passes)
+            ),
+            inline=False
+        )
+    embed.set_footer(text="!retention <days|off|default> to change · !retention run to compact now")
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='memory')
+async def memory_command(ctx, action: str = None):
+    """Show memory usage, data sizes and allocation hot spots (bot owner only)"""
+    # Process-wide: tracing slows every server and the counts cover all of them
+    if not await bot.is_owner(ctx.author):
+        await ctx.send("❌ Only the bot owner can view memory usage.")
+        return
+    
+    if action == "trace":
+        if memory_sampler.tracing:
+            memory_sampler.stop_tracing()
+            await ctx.send("🧠 Allocation tracing stopped.")
+        else:
+            memory_sampler.start_tracing()
+            await ctx.send("🧠 Allocation tracing started. Use `!memory top` later to see what has grown.")
+        return
+    
+    if action == "top":
+        if not memory_sampler.tracing:
+            await ctx.send("❌ Allocation tracing is off. Start it with `!memory trace`.")
+            return
+        top = await scheduler.run_blocking('memory_top', memory_sampler.top_allocations)
+        lines = [f"`{where}` {size / 1024:+,.0f}KB ({count:+,} objects)" for where, size, count in top]
+        embed = discord.Embed(
+            title="🧠 Allocation Growth Since Tracing Started",
+            description="\n".join(lines) or "No growth recorded yet",
+            color=0x95a5a6
+        )
+        await ctx.send(embed=embed)
+        return
+    
+    if action == "objects":
+        top = await scheduler.run_blocking('memory_objects', top_object_types, 15)
+        embed = discord.Embed(
+            title="🧠 Live Objects by Type",
+            description="\n".join(f"`{name}` {count:,}" for name, count in top),
+            color=0x95a5a6
+        )
+        await ctx.send(embed=embed)
+        return
+    
+    await sample_memory_job()
+    _, rss, traced, sizes = memory_sampler.samples[-1]
+    growth = memory_sampler.growth()
+    
+    embed = discord.Embed(
+        title="🧠 Memory Usage",
+        description=f"RSS {rss / 1e6:.1f}MB" + (f" · traced {traced / 1e6:.1f}MB" if memory_sampler.tracing else ""),
+        color=0x95a5a6
+    )
+    embed.add_field(
+        name="Data & caches",
+        value="\n".join(
+            f"`{key}` {value:,}" + (f" ({growth[key]:+,})" if growth.get(key) else "")
+            for key, value in sizes.items()
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name="Limits",
+        value=f"max_messages: {MAX_MESSAGES or 'off'} · member cache: {MEMBER_CACHE}\n"
+              f"alert at {memory_sampler.rss_alert / 1e6:.0f}MB RSS or {memory_sampler.growth_alert_pct:.0f}% growth",
+        inline=False
+    )
+    embed.set_footer(text=f"{len(memory_sampler.samples)} samples · `!memory trace|top|objects` for more")
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='sync')
+async def sync_command(ctx):
+    """Sync slash commands with Discord after they change (bot owner only)"""
+    if not await bot.is_owner(ctx.author):
+        await ctx.send("❌ Only the bot owner can sync slash commands.")
+        return
+    
+    count = await sync_commands()
+    if count is None:
+        await ctx.send("❌ Slash command sync failed. Discord may be rate limiting; try again later.")
+    else:
+        await ctx.send(f"✅ Synced {count} slash commands.")
+
 @bot.command(name='help')
 async def help_command(ctx):
     """Show help information"""
@@ -514,7 +1512,7 @@ async def help_command(ctx):
     
     embed.add_field(
         name="🎲 Rolling Commands",
-        value="`e!roll` or `e!w` - Roll a random Pokemon (1-1025)\n`!number` - Roll a random number (1-100)\n`!recent` - Show your recent Pokemon rolls\n\n**Universal Pokemon Roll Detection:**\nResponds to Pokemon roll commands (1025 only):\n`!roll 1025`, `?w 1025`, `>roll pokemon`, etc.\n*Does NOT respond to regular number rolls*",
+        value="`e!roll` or `e!w` - Roll a random Pokemon (1-1025)\n`!multiroll [count]` - Roll up to 10 Pokemon at once\n`!number` - Roll a random number (1-100)\n`!recent` - Show your recent Pokemon rolls\n`!dex [page] [@user]` - Show collected Pokemon\n`!whohas <name|id>` - See who has rolled a Pokemon\n`/pokedex <name>` - Look up a Pokemon\n\n**Universal Pokemon Roll Detection:**\nResponds to Pokemon roll commands (1025 only):\n`!roll 1025`, `?w 1025`, `>roll pokemon`, etc.\n*Does NOT respond to regular number rolls*",
         inline=False
     )
     
@@ -526,13 +1524,13 @@ async def help_command(ctx):
     
     embed.add_field(
         name="🎰 Gambling Commands",
-        value="`!gamble log @winner @loser` - Log gambling result\n`!logs` - Show recent gambling logs",
+        value="`!gamble log @winner @loser [amount] [currency]` - Log gambling result\n`!logs` - Show recent gambling logs\n`!h2h @user1 [@user2]` - Show head-to-head record\n`!balance [@user]` - Show wager balance\n`!settle @user [confirm]` - Settle up with a user\n`!tradelog [@user] [#channel] [days:N] [keywords]` - Search trade channel messages",
         inline=False
     )
     
     embed.add_field(
         name="📊 Info Commands",
-        value="`!stats [@user]` - Show user statistics\n`!help` - Show this help message",
+        value="`!stats [day|week|month] [@user]` - Show user statistics\n`!activity [@user]` - Show recent activity\n`!trends` - Show server trends\n`!latency` - Show bot latency\n`!export <logs|rolls>` - Export data (admin only)\n`!retention [days|off|default|run]` - Gambling log retention (admin only)\n`!memory [trace|top|objects]` - Memory usage (bot owner only)\n`!sync` - Sync slash commands (bot owner only)\n`!help` - Show this help message",
         inline=False
     )
     
@@ -545,4 +1543,16 @@ if __name__ == "__main__":
         print("ERROR: Please set the DISCORD_BOT_TOKEN environment variable")
         exit(1)
     
-    bot.run(token)
\ No newline at end of file
+    async def main():
+        discord.utils.setup_logging()
+        async with bot:
+            try:
+                await bot.start(token)
+            finally:
+                # Let subscribers finish anything still queued before exiting
+                await bus.close()
+                await flush_saves()
+                await scheduler.close()
+                trades.close()
+    
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Idempotency for message handling, keyed by Discord message ID.
+
+Every handler that answers a message claims the message's key first and
+backs off if the claim fails, so a message produces one roll, one record
+and one reply even when several triggers fire for it or the gateway
+redelivers it.
+
+Claims are always checked against a bounded set of recently seen keys. When
+several bot instances answer the same channels (e.g. during a rolling
+deploy), point them all at the same ``CLAIMS_DB`` SQLite file: the first
+instance to insert a key wins and the others stay quiet.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, Optional
+
+
+class RecentKeys:
+    """Bounded set of recently claimed keys, oldest evicted first"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._keys: 'OrderedDict[str, None]' = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str) -> bool:
+        """Add a key, returning False if it was already present"""
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        return True
+
+
+class SharedClaims:
+    """Claims table in a SQLite file shared by every instance on the host"""
+
+    def __init__(self, path: str, owner: str, ttl: float = 24 * 60 * 60):
+        self.path = path
+        self.owner = owner
+        self.ttl = ttl
+        self._last_prune = 0.0
+        with closing(self._connect()) as db, db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS claims ('
+                'key TEXT PRIMARY KEY, owner TEXT NOT NULL, claimed_at REAL NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # A fresh connection per call, since claims run on executor threads. Callers
+        # close it: using a connection as a context manager only commits.
+        return sqlite3.connect(self.path, timeout=5)
+
+    def claim(self, key: str) -> bool:
+        """Insert the key, returning False if another instance got there first"""
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            inserted = db.execute(
+                'INSERT OR IGNORE INTO claims (key, owner, claimed_at) VALUES (?, ?, ?)',
+                (key, self.owner, now)
+            ).rowcount == 1
+            if now - self._last_prune > self.ttl / 24:
+                self._last_prune = now
+                db.execute('DELETE FROM claims WHERE claimed_at < ?', (now - self.ttl,))
+        return inserted
+
+
+class Deduplicator:
+    """Claims message keys locally and, optionally, across instances"""
+
+    def __init__(self, maxsize: int = 10000, shared_path: Optional[str] = None, owner: Optional[str] = None):
+        self.recent = RecentKeys(maxsize)
+        self.shared = SharedClaims(shared_path, owner or f'pid-{os.getpid()}') if shared_path else None
+        self.stats: Dict[str, int] = {'claimed': 0, 'duplicate': 0, 'other_instance': 0, 'shared_errors': 0}
+
+    async def claim(self, key: str, shared: bool = True) -> bool:
+        """Return True if this process should handle ``key``, False if it already has been
+
+        The local set is updated before any await, so concurrent handlers in
+        this process can't both win. If the shared table can't be reached the
+        claim is allowed: a rare duplicate reply beats dropping the message.
+        """
+        if not self.recent.add(key):
+            self.stats['duplicate'] += 1
+            return False
+        if shared and self.shared is not None:
+            try:
+                won = await asyncio.get_running_loop().run_in_executor(None, self.shared.claim, key)
+            except sqlite3.Error as e:
+                print(f"Shared claim for {key} failed: {e}")
+                self.stats['shared_errors'] += 1
+            else:
+                if not won:
+                    self.stats['other_instance'] += 1
+                    return False
+        self.stats['claimed'] += 1
+        return True
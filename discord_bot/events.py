@@ -0,0 +1,166 @@
+"""Domain events and the async bus that delivers them to subscribers.
+
+Command handlers make their change to ``ewager.data``, emit an event and
+reply straight away. Derived indexes, stats and persistence are updated by
+subscribers running on a single consumer task, which sees events in the
+order they were emitted. The queue is bounded: when it is full, ``emit``
+waits, slowing producers down instead of letting the backlog grow.
+
+Handlers call ``emit`` right after their change, with no await in between,
+so until ``settle()`` returns some derived state may lag behind the data.
+Anything that must see both in step (saving a snapshot) waits for it.
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Type, Union
+
+
+@dataclass
+class RollRecorded:
+    user_id: str
+    guild_id: Optional[str]
+    roll: Dict
+
+
+@dataclass
+class GambleLogged:
+    log: Dict
+
+
+@dataclass
+class TournamentJoined:
+    tournament_id: str
+    user_id: str
+
+
+Handler = Callable[[object], Union[None, Awaitable[None]]]
+
+
+class LatencyTracker:
+    """Rolling latency samples grouped by (kind, name)"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, kind: str, name: str, seconds: float):
+        samples = self.samples.get((kind, name))
+        if samples is None:
+            samples = self.samples[(kind, name)] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def summary(self) -> List[Tuple[str, str, int, float, float]]:
+        """Return (kind, name, count, p50_ms, p99_ms) for every series"""
+        rows = []
+        for (kind, name), samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            p50 = ordered[len(ordered) // 2]
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            rows.append((kind, name, len(ordered), p50 * 1000, p99 * 1000))
+        return rows
+
+
+class EventBus:
+    """Bounded, ordered async event queue with typed subscribers"""
+
+    def __init__(self, maxsize: int = 1000):
+        self.queue: Optional[asyncio.Queue] = None
+        self.maxsize = maxsize
+        self.subscribers: Dict[Type, List[Handler]] = {}
+        self.idle_callbacks: List[Callable[[], None]] = []
+        self.metrics = LatencyTracker()
+        self._task: Optional[asyncio.Task] = None
+        # Events emitted (including emits still waiting for room) but not yet delivered
+        self._undelivered = 0
+        self._settled = asyncio.Event()
+        self._settled.set()
+
+    def subscribe(self, event_type: Type, handler: Handler):
+        """Call ``handler(event)`` for every event of ``event_type``, in subscription order"""
+        self.subscribers.setdefault(event_type, []).append(handler)
+
+    def on_idle(self, callback: Callable[[], None]):
+        """Call ``callback()`` whenever the queue has been drained"""
+        self.idle_callbacks.append(callback)
+
+    def start(self):
+        """Start the consumer task on the running loop"""
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=self.maxsize)
+            self._task = asyncio.create_task(self._consume())
+
+    async def emit(self, event):
+        """Queue an event, waiting for room if the queue is full"""
+        # Counted before the first await, so settle() can't slip in between
+        self._undelivered += 1
+        self._settled.clear()
+        if self.queue is None:
+            # Not started (e.g. during tests or shutdown): deliver inline
+            try:
+                await self._deliver(event, time.perf_counter())
+            finally:
+                self._done()
+            self._idle()
+            return
+        try:
+            await self.queue.put((event, time.perf_counter()))
+        except BaseException:
+            self._done()
+            raise
+
+    def _done(self):
+        self._undelivered -= 1
+        if not self._undelivered:
+            self._settled.set()
+
+    async def settle(self):
+        """Wait until every emitted event has been delivered to its subscribers
+
+        Returns with nothing undelivered and no await left before the caller
+        resumes, so data and derived state can be read together.
+        """
+        while self._undelivered:
+            await self._settled.wait()
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def _deliver(self, event, emitted_at: float):
+        for handler in self.subscribers.get(type(event), []):
+            try:
+                result = handler(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Event handler {getattr(handler, '__name__', handler)} failed for {type(event).__name__}: {e}")
+        self.metrics.record('processing', type(event).__name__, time.perf_counter() - emitted_at)
+
+    def _idle(self):
+        for callback in self.idle_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Idle callback {getattr(callback, '__name__', callback)} failed: {e}")
+
+    async def _consume(self):
+        while True:
+            event, emitted_at = await self.queue.get()
+            try:
+                await self._deliver(event, emitted_at)
+            finally:
+                self._done()
+                self.queue.task_done()
+            if self.queue.empty():
+                self._idle()
+
+    async def close(self):
+        """Deliver everything still queued, then stop the consumer"""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        self._task = None
+        self.queue = None
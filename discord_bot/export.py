@@ -0,0 +1,113 @@
+"""Streaming export of gambling logs and Pokemon rolls to compressed files.
+
+Records are pulled through generators and written straight to a gzip
+file, so an export never holds more than one row (or one user's rolls) in
+memory. The writers are plain blocking functions meant to run in an
+executor; what they iterate over is fixed on the event loop first (a copy
+of the log list, the selected users) so the bot can keep changing its data
+while they run.
+
+Exports are scoped to one guild: rows are kept only if their ``guild_id``
+matches. DM rows and legacy rows stored before guilds were tracked (no
+``guild_id``) can't be attributed to a server, so they are never exported.
+"""
+import csv
+import gzip
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from snapshot import decode_source
+
+LOG_FIELDS = ['timestamp', 'guild_id', 'winner_id', 'loser_id', 'logged_by', 'amount', 'currency']
+ROLL_FIELDS = ['timestamp', 'user_id', 'guild_id', 'id', 'name', 'types', 'height', 'weight']
+FORMATS = ('csv', 'jsonl')
+
+
+def in_range(timestamp: str, since: Optional[str], until: Optional[str]) -> bool:
+    """Check an ISO timestamp against an optional [since, until) range
+
+    Timestamps are all written by datetime.isoformat(), so plain string
+    comparison orders them correctly without parsing each one.
+    """
+    if since and timestamp < since:
+        return False
+    if until and timestamp >= until:
+        return False
+    return True
+
+
+def iter_gambling_logs(logs: List[Dict], guild_id: str, since: Optional[str] = None, until: Optional[str] = None,
+                       user_id: Optional[str] = None) -> Iterator[Dict]:
+    """Yield a guild's gambling log entries matching the filters
+
+    Pass a copy of the logs taken on the event loop (``list(logs)``) when
+    iterating in a worker thread, so appends and compaction can't shift it.
+    """
+    for log in logs:
+        if log.get('guild_id') != guild_id:
+            continue
+        if user_id and user_id not in (log['winner_id'], log['loser_id']):
+            continue
+        if in_range(log['timestamp'], since, until):
+            yield log
+
+
+def select_users(users: Dict[str, Dict], user_id: Optional[str] = None) -> List[Tuple[str, object]]:
+    """(user ID, record or snapshot location) for the users to export
+
+    Call on the event loop; the result can then be read by
+    ``iter_pokemon_rolls`` in a worker thread. Lazily loaded users are
+    located rather than decoded, and decoded there without being kept.
+    """
+    selected = [user_id] if user_id else list(users)
+    locate = getattr(users, 'locate', None)
+    if locate is not None:
+        return locate(selected)
+    return [(owner_id, users[owner_id]) for owner_id in selected if owner_id in users]
+
+
+def iter_pokemon_rolls(sources: List[Tuple[str, object]], guild_id: str, since: Optional[str] = None,
+                       until: Optional[str] = None) -> Iterator[Dict]:
+    """Yield a guild's Pokemon rolls by the users from ``select_users`` in range, tagged with the rolling user"""
+    for owner_id, source in sources:
+        if isinstance(source, dict):
+            # Copied in one step: the user may roll again while the export runs
+            rolls = list(source.get('pokemon_rolls', []))
+        else:
+            rolls = decode_source(source).get('pokemon_rolls', [])
+        for roll in rolls:
+            if roll.get('guild_id') == guild_id and in_range(roll['timestamp'], since, until):
+                row = dict(roll, user_id=owner_id)
+                row['types'] = '/'.join(roll.get('types', []))
+                yield row
+
+
+def write_export(rows: Iterable[Dict], fields: List[str], fmt: str, path: str) -> int:
+    """Write rows to a gzip-compressed CSV or JSONL file, returning the row count"""
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps({field: row.get(field) for field in fields}))
+                f.write('\n')
+                count += 1
+    return count
+
+
+def export_to_tempfile(rows: Iterable[Dict], fields: List[str], fmt: str) -> Tuple[str, int]:
+    """Write an export to a new temporary file, returning (path, row_count)"""
+    fd, path = tempfile.mkstemp(prefix='ewager_export_', suffix=f'.{fmt}.gz')
+    os.close(fd)
+    try:
+        return path, write_export(rows, fields, fmt, path)
+    except Exception:
+        os.remove(path)
+        raise
@@ -0,0 +1,175 @@
+"""In-memory indexes derived from the EWagerBot data file.
+
+Indexes are maintained incrementally as events happen. The owners index is
+also saved in the snapshot so startup needn't rebuild it; it is rebuilt
+from user records when missing or saved by an older version. The rivalry
+index is rebuilt at startup from the remaining gambling logs plus the pair
+records of logs dropped by retention, which ``RivalryIndex.dump()`` writes
+into ``gambling_summary`` and which are the only record of those logs.
+"""
+from typing import Dict, List, Optional, Tuple
+
+
+# Owner index bucket for rolls stored before guilds were tracked (no 'guild_id' field)
+LEGACY_GUILD = 'legacy'
+
+
+def guild_key(guild_id) -> str:
+    """Normalize a guild ID for use as an index key ('' for DMs)"""
+    return str(guild_id) if guild_id else ''
+
+
+def roll_guild_key(roll: Dict) -> str:
+    """Index key for where a stored roll happened, telling DM rolls from legacy ones"""
+    if 'guild_id' not in roll:
+        return LEGACY_GUILD
+    return guild_key(roll['guild_id'])
+
+
+class OwnershipIndex:
+    """Inverted index from Pokemon ID to the users who rolled it, per guild"""
+
+    # Bumped when the meaning of stored buckets changes, so older dumps are rebuilt
+    VERSION = 2
+
+    def __init__(self):
+        # guild -> pokemon_id -> user_id -> number of times rolled
+        self.owners: Dict[str, Dict[int, Dict[str, int]]] = {}
+        # lowercase pokemon name -> pokemon_id
+        self.names: Dict[str, int] = {}
+
+    def add(self, guild_id, user_id: str, pokemon_id: int, name: Optional[str] = None):
+        """Record that a user rolled a Pokemon in a guild"""
+        by_pokemon = self.owners.setdefault(guild_key(guild_id), {})
+        by_user = by_pokemon.setdefault(int(pokemon_id), {})
+        by_user[user_id] = by_user.get(user_id, 0) + 1
+        if name:
+            self.names[name.lower()] = int(pokemon_id)
+
+    def rebuild(self, users: Dict[str, Dict]):
+        """Rebuild the whole index from stored user records"""
+        self.owners = {}
+        self.names = {}
+        for user_id, user_data in users.items():
+            for roll in user_data.get('pokemon_rolls', []):
+                self.add(roll_guild_key(roll), user_id, roll['id'], roll.get('name'))
+
+    def dump(self) -> Dict:
+        """Serialize the index for storage alongside a snapshot"""
+        return {
+            'version': self.VERSION,
+            'owners': {guild: {str(pokemon_id): dict(users) for pokemon_id, users in by_pokemon.items()}
+                       for guild, by_pokemon in self.owners.items()},
+            'names': dict(self.names)
+        }
+
+    def load(self, state: Dict) -> bool:
+        """Restore an index serialized by dump(), returning False if it is from an older version"""
+        if state.get('version') != self.VERSION:
+            return False
+        self.owners = {guild: {int(pokemon_id): users for pokemon_id, users in by_pokemon.items()}
+                       for guild, by_pokemon in state['owners'].items()}
+        self.names = state['names']
+        return True
+
+    def resolve(self, query: str) -> Optional[int]:
+        """Resolve a Pokemon name or ID (with or without a leading #) to an ID"""
+        query = query.strip().lower().lstrip('#')
+        if query.isdigit():
+            return int(query)
+        return self.names.get(query)
+
+    def who_has(self, guild_id, pokemon_id: int) -> List[Tuple[str, int]]:
+        """Return (user_id, count) pairs for a Pokemon, most rolls first
+
+        Rolls recorded before guilds were tracked are included for every
+        guild; DM rolls only for DM queries.
+        """
+        counts: Dict[str, int] = {}
+        for key in {guild_key(guild_id), LEGACY_GUILD}:
+            for user_id, count in self.owners.get(key, {}).get(int(pokemon_id), {}).items():
+                counts[user_id] = counts.get(user_id, 0) + count
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def pair_key(user_a: str, user_b: str) -> Tuple[str, str]:
+    """Order-independent key for a pair of users"""
+    return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+
+class RivalryIndex:
+    """Head-to-head records for every pair of users who have gambled together"""
+
+    def __init__(self):
+        # (user_a, user_b) -> {'wins': {user: n}, 'last_winner', 'last_timestamp', 'streak_holder', 'streak'}
+        self.pairs: Dict[Tuple[str, str], Dict] = {}
+        # user_id -> opponent_id -> games played
+        self.opponents: Dict[str, Dict[str, int]] = {}
+
+    def add(self, winner_id: str, loser_id: str, timestamp: str):
+        """Record a logged gambling result"""
+        key = pair_key(winner_id, loser_id)
+        record = self.pairs.get(key)
+        if record is None:
+            record = self.pairs[key] = {
+                'wins': {key[0]: 0, key[1]: 0},
+                'last_winner': None,
+                'last_timestamp': None,
+                'streak_holder': None,
+                'streak': 0
+            }
+        record['wins'][winner_id] += 1
+        record['last_winner'] = winner_id
+        record['last_timestamp'] = timestamp
+        if record['streak_holder'] == winner_id:
+            record['streak'] += 1
+        else:
+            record['streak_holder'] = winner_id
+            record['streak'] = 1
+
+        for user_id, opponent_id in ((winner_id, loser_id), (loser_id, winner_id)):
+            games = self.opponents.setdefault(user_id, {})
+            games[opponent_id] = games.get(opponent_id, 0) + 1
+
+    def rebuild(self, logs: List[Dict], folded: Optional[Dict[str, Dict]] = None):
+        """Rebuild the whole index from stored gambling logs
+
+        ``folded`` holds the pair records of logs already compacted away
+        (see ``dump``); the remaining logs are replayed on top of them.
+        """
+        self.load(folded or {})
+        for log in logs:
+            self.add(log['winner_id'], log['loser_id'], log['timestamp'])
+
+    def dump(self) -> Dict[str, Dict]:
+        """JSON-friendly copy of the pair records, keyed 'user_a:user_b'"""
+        return {f"{a}:{b}": {**record, 'wins': dict(record['wins'])} for (a, b), record in self.pairs.items()}
+
+    def load(self, stored: Dict[str, Dict]):
+        """Replace the index with pair records produced by ``dump``"""
+        self.pairs = {}
+        self.opponents = {}
+        for key, record in stored.items():
+            user_a, user_b = key.split(':')
+            self.pairs[(user_a, user_b)] = {**record, 'wins': dict(record['wins'])}
+            games = sum(record['wins'].values())
+            for user_id, opponent_id in ((user_a, user_b), (user_b, user_a)):
+                self.opponents.setdefault(user_id, {})[opponent_id] = games
+
+    def totals(self, user_id: str) -> Tuple[int, int]:
+        """Lifetime (wins, losses) for a user across every opponent"""
+        wins = losses = 0
+        for opponent_id, games in self.opponents.get(user_id, {}).items():
+            won = self.pairs[pair_key(user_id, opponent_id)]['wins'][user_id]
+            wins += won
+            losses += games - won
+        return wins, losses
+
+    def head_to_head(self, user_a: str, user_b: str) -> Optional[Dict]:
+        """Return the record between two users, or None if they've never played"""
+        return self.pairs.get(pair_key(user_a, user_b))
+
+    def top_rivals(self, user_id: str, limit: int = 3) -> List[Tuple[str, int]]:
+        """Return the opponents a user has played most, as (opponent_id, games) pairs"""
+        games = self.opponents.get(user_id, {})
+        return sorted(games.items(), key=lambda item: (-item[1], item[0]))[:limit]
@@ -0,0 +1,192 @@
+"""Double-entry wager ledger with balance and net-owed indexes.
+
+Ledger rows live in ``ewager.data['ledger']['entries']``. Every
+transaction writes one row per side with opposite signs, so the rows of a
+transaction always sum to zero:
+
+    {'seq': 7, 'txn': 4, 'kind': 'wager', 'user_id': '123', 'counterparty': '456',
+     'amount': 50, 'currency': 'coins', 'timestamp': '2024-01-31T13:00:00'}
+
+``wager`` rows move winnings from the loser to the winner and also leave the
+loser owing the winner; ``settlement`` rows record the debt being paid off
+and only touch what is owed. Balances and the net-owed matrix are kept in
+memory and checkpointed every ``CHECKPOINT_INTERVAL`` rows, so startup only
+replays rows written after the last checkpoint.
+
+Rows a checkpoint covers are moved out of ``entries`` into
+``ewager.data['ledger_archive']``, one block per checkpoint keyed by its
+first seq. Nothing reads them back while the bot runs: the section is
+stored lazily in the snapshot, and blocks are stored already encoded, so
+saves copy their bytes from file to file without decoding them.
+"""
+from typing import Dict, List, MutableMapping, Optional, Tuple
+
+from snapshot import encode
+
+CHECKPOINT_INTERVAL = 500
+DEFAULT_CURRENCY = 'coins'
+
+
+def pair_id(user_a: str, user_b: str) -> str:
+    """Order-independent JSON-friendly key for a pair of users"""
+    return f"{user_a}:{user_b}" if user_a < user_b else f"{user_b}:{user_a}"
+
+
+def add_amount(amounts: Dict[str, float], currency: str, amount: float):
+    """Add to a per-currency amount, dropping currencies that reach zero"""
+    total = round(amounts.get(currency, 0) + amount, 2)
+    if total:
+        amounts[currency] = total
+    else:
+        amounts.pop(currency, None)
+
+
+def format_amount(amount: float, currency: str) -> str:
+    return f"{amount:,.2f}".rstrip('0').rstrip('.') + f" {currency}"
+
+
+class Ledger:
+    """Wager ledger plus per-user balances and pairwise amounts owed"""
+
+    def __init__(self, store: Dict, archive: Optional[MutableMapping[str, Dict]] = None):
+        self.store = store
+        self.store.setdefault('entries', [])
+        self.store.setdefault('checkpoint', {'seq': 0, 'next_txn': 1, 'balances': {}, 'net': {}})
+        self.archive = archive if archive is not None else {}
+        # user_id -> currency -> lifetime net winnings
+        self.balances: Dict[str, Dict[str, float]] = {}
+        # pair_id -> currency -> amount the second user owes the first (negative: first owes second)
+        self.net: Dict[str, Dict[str, float]] = {}
+        # user_id -> users they have outstanding amounts with
+        self.counterparties: Dict[str, set] = {}
+        self.next_txn = 1
+        self.replay()
+        # Ledgers from before archiving kept every row in entries
+        self._archive_covered()
+
+    def replay(self):
+        """Restore indexes from the last checkpoint plus the rows written after it"""
+        checkpoint = self.store['checkpoint']
+        self.balances = {user_id: dict(amounts) for user_id, amounts in checkpoint['balances'].items()}
+        self.net = {key: dict(amounts) for key, amounts in checkpoint['net'].items()}
+        self.counterparties = {}
+        for key in self.net:
+            user_a, user_b = key.split(':')
+            self.counterparties.setdefault(user_a, set()).add(user_b)
+            self.counterparties.setdefault(user_b, set()).add(user_a)
+        self.next_txn = checkpoint['next_txn']
+
+        entries = self.store['entries']
+        # Rows are appended in seq order, so skip straight past the checkpoint
+        start = len(entries) - (entries[-1]['seq'] - checkpoint['seq']) if entries else 0
+        for row in entries[max(0, start):]:
+            self._apply(row)
+            self.next_txn = max(self.next_txn, row['txn'] + 1)
+
+    def _apply(self, row: Dict):
+        user_id, other_id = row['user_id'], row['counterparty']
+        if row['kind'] == 'wager':
+            add_amount(self.balances.setdefault(user_id, {}), row['currency'], row['amount'])
+
+        # Both sides' rows arrive; apply the net change once, from the receiving side
+        if row['amount'] > 0:
+            key = pair_id(user_id, other_id)
+            owed = row['amount'] if row['kind'] == 'wager' else -row['amount']
+            sign = 1 if key.startswith(f"{user_id}:") else -1
+            amounts = self.net.setdefault(key, {})
+            add_amount(amounts, row['currency'], sign * owed)
+            if amounts:
+                self.counterparties.setdefault(user_id, set()).add(other_id)
+                self.counterparties.setdefault(other_id, set()).add(user_id)
+            else:
+                del self.net[key]
+                self.counterparties.get(user_id, set()).discard(other_id)
+                self.counterparties.get(other_id, set()).discard(user_id)
+
+    def _post(self, kind: str, from_id: str, to_id: str, amount: float, currency: str, timestamp: str) -> int:
+        txn = self.next_txn
+        self.next_txn += 1
+        entries = self.store['entries']
+        seq = entries[-1]['seq'] if entries else self.store['checkpoint']['seq']
+        for user_id, counterparty, signed in ((from_id, to_id, -amount), (to_id, from_id, amount)):
+            seq += 1
+            row = {
+                'seq': seq,
+                'txn': txn,
+                'kind': kind,
+                'user_id': user_id,
+                'counterparty': counterparty,
+                'amount': signed,
+                'currency': currency,
+                'timestamp': timestamp
+            }
+            entries.append(row)
+            self._apply(row)
+
+        if seq - self.store['checkpoint']['seq'] >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+        return txn
+
+    def record_wager(self, winner_id: str, loser_id: str, amount: float, currency: str, timestamp: str) -> int:
+        """Record a wager won by ``winner_id``; returns the transaction ID"""
+        return self._post('wager', loser_id, winner_id, amount, currency, timestamp)
+
+    def record_settlement(self, payer_id: str, payee_id: str, amount: float, currency: str, timestamp: str) -> int:
+        """Record ``payer_id`` paying off what they owe ``payee_id``; returns the transaction ID"""
+        return self._post('settlement', payer_id, payee_id, amount, currency, timestamp)
+
+    def checkpoint(self):
+        """Snapshot the current indexes so startup replays only newer rows"""
+        entries = self.store['entries']
+        self.store['checkpoint'] = {
+            'seq': entries[-1]['seq'] if entries else self.store['checkpoint']['seq'],
+            'next_txn': self.next_txn,
+            'balances': {user_id: dict(amounts) for user_id, amounts in self.balances.items()},
+            'net': {key: dict(amounts) for key, amounts in self.net.items()}
+        }
+        self._archive_covered()
+
+    def _archive_covered(self):
+        """Move rows the checkpoint covers from entries to the archive"""
+        entries = self.store['entries']
+        covered = 0
+        while covered < len(entries) and entries[covered]['seq'] <= self.store['checkpoint']['seq']:
+            covered += 1
+        if covered:
+            key = f"{entries[0]['seq']:012d}"
+            block = {'rows': entries[:covered]}
+            put_encoded = getattr(self.archive, 'put_encoded', None)
+            if put_encoded is not None:
+                put_encoded(key, encode(block))
+            else:
+                self.archive[key] = block
+            del entries[:covered]
+
+    def balance(self, user_id: str) -> Dict[str, float]:
+        """Lifetime net winnings per currency"""
+        return self.balances.get(user_id, {})
+
+    def owed(self, user_id: str, other_id: str) -> Dict[str, float]:
+        """Amounts ``other_id`` owes ``user_id`` per currency (negative: user owes other)"""
+        key = pair_id(user_id, other_id)
+        amounts = self.net.get(key, {})
+        if key.startswith(f"{user_id}:"):
+            return dict(amounts)
+        return {currency: -amount for currency, amount in amounts.items()}
+
+    def outstanding(self, user_id: str) -> List[Tuple[str, str, float]]:
+        """Every outstanding amount for a user as (other_id, currency, amount owed to user)"""
+        result = []
+        for other_id in sorted(self.counterparties.get(user_id, ())):
+            for currency, amount in self.owed(user_id, other_id).items():
+                result.append((other_id, currency, amount))
+        return result
+
+
+def parse_amount(text: Optional[str]) -> Optional[float]:
+    """Parse a positive wager amount, returning None if it isn't one"""
+    try:
+        amount = round(float(text.replace(',', '')), 2)
+    except (AttributeError, ValueError):
+        return None
+    return amount if amount > 0 else None
@@ -0,0 +1,132 @@
+"""Memory introspection for long-running bots.
+
+``MemorySampler`` periodically records process RSS, tracemalloc totals and
+the sizes of the bot's data and caches, and reports alerts when RSS or its
+growth crosses a threshold. Allocation tracing is off by default because
+tracemalloc slows every allocation; it can be turned on at startup with
+``EWAGER_TRACEMALLOC=1`` or later from the ``!memory trace`` command.
+"""
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def data_sizes(ewager, bot=None) -> Dict[str, int]:
+    """Entry counts for each category of bot data, index and cache
+
+    Rolls are only counted for users whose records are loaded, so sampling
+    never forces lazily stored users into memory.
+    """
+    users = ewager.data['users']
+    loaded_users = users.loaded_items() if hasattr(users, 'loaded_items') else list(users.items())
+    sizes = {
+        'users': len(users),
+        'users_loaded': len(loaded_users),
+        'rolls_loaded': sum(len(user.get('pokemon_rolls', ())) for _, user in loaded_users),
+        'tournaments': len(ewager.data['tournaments']),
+        'gambling_logs': len(ewager.data['gambling_logs']),
+        'ledger_entries': len(ewager.ledger.store['entries']),
+        'ledger_archive_blocks': len(ewager.ledger.archive),
+        'rollup_series': sum(len(series) for series in ewager.rollups.store.values()),
+        'owner_index_pokemon': sum(len(by_pokemon) for by_pokemon in ewager.owners.owners.values()),
+        'rivalry_pairs': len(ewager.rivalries.pairs),
+        'pokedex_names': len(ewager.pokedex),
+    }
+    if bot is not None:
+        sizes['discord_users'] = len(bot.users)
+        sizes['discord_messages'] = len(bot.cached_messages)
+        sizes['discord_members'] = sum(len(guild.members) for guild in bot.guilds)
+    return sizes
+
+
+def top_object_types(limit: int = 10) -> List[Tuple[str, int]]:
+    """Most common live object types tracked by the garbage collector"""
+    return Counter(type(obj).__name__ for obj in gc.get_objects()).most_common(limit)
+
+
+class MemorySampler:
+    """Periodic memory samples with threshold alerts"""
+
+    def __init__(self, rss_alert_mb: float = 512, growth_alert_pct: float = 25, history: int = 144,
+                 trace: bool = False):
+        self.rss_alert = rss_alert_mb * 1024 * 1024
+        self.growth_alert_pct = growth_alert_pct
+        # (timestamp, rss_bytes, traced_bytes, sizes)
+        self.samples: Deque[Tuple[float, int, int, Dict[str, int]]] = deque(maxlen=history)
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._alerted_rss = False
+        if trace:
+            self.start_tracing()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self._baseline = None
+
+    def sample(self, ewager, bot=None) -> List[str]:
+        """Record a sample and return any alert messages it triggered"""
+        rss = rss_bytes()
+        traced = tracemalloc.get_traced_memory()[0] if self.tracing else 0
+        sizes = data_sizes(ewager, bot)
+        self.samples.append((time.time(), rss, traced, sizes))
+
+        alerts = []
+        if rss >= self.rss_alert:
+            # Only alert when crossing the threshold, not on every sample above it
+            if not self._alerted_rss:
+                alerts.append(f"RSS is {rss / 1e6:.0f}MB, above the {self.rss_alert / 1e6:.0f}MB limit")
+            self._alerted_rss = True
+        else:
+            self._alerted_rss = False
+
+        if len(self.samples) == self.samples.maxlen:
+            oldest_rss = self.samples[0][1]
+            growth = (rss - oldest_rss) * 100 / oldest_rss
+            if growth >= self.growth_alert_pct:
+                alerts.append(f"RSS grew {growth:.0f}% over the last {len(self.samples)} samples")
+                # Start a fresh window so the same growth isn't reported every sample
+                self.samples.clear()
+                self.samples.append((time.time(), rss, traced, sizes))
+        return alerts
+
+    def growth(self) -> Dict[str, int]:
+        """Change in each data size between the oldest and newest sample"""
+        if len(self.samples) < 2:
+            return {}
+        first, last = self.samples[0][3], self.samples[-1][3]
+        return {key: last[key] - first.get(key, 0) for key in last}
+
+    def top_allocations(self, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """Source lines whose allocations grew most since tracing started: (where, size_diff, count_diff)"""
+        if not self.tracing or self._baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        stats = snapshot.compare_to(self._baseline, 'lineno')[:limit]
+        return [(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                 stat.size_diff, stat.count_diff) for stat in stats]
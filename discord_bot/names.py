@@ -0,0 +1,100 @@
+"""Display-name resolution for user IDs stored in the EWagerBot data file."""
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def fallback_name(user_id: str) -> str:
+    """Placeholder shown when a user can't be resolved"""
+    return f"User {user_id[:8]}..."
+
+
+class NameResolver:
+    """Resolve user IDs to display names with a TTL cache and batched fetching
+
+    Lookups first try the gateway cache (guild members, then users). Anything
+    still unknown is fetched from the API concurrently, at most
+    ``max_concurrency`` requests at a time, and cached for ``ttl`` seconds.
+    Failed lookups are cached for ``negative_ttl`` seconds so a deleted
+    account doesn't cost a request on every render.
+    """
+
+    def __init__(self, client, ttl: float = 3600, negative_ttl: float = 300, max_concurrency: int = 5,
+                 max_entries: int = 10000):
+        self.client = client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _cached(self, user_id: str) -> Optional[str]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[user_id]
+            return None
+        return name
+
+    def _store(self, user_id: str, name: str, ttl: float):
+        if len(self._cache) >= self.max_entries:
+            # Drop the oldest inserted entry; dicts keep insertion order
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[user_id] = (name, time.monotonic() + ttl)
+
+    def lookup_cached(self, user_id: str, guild=None) -> Optional[str]:
+        """Resolve a name without making any API requests"""
+        if guild is not None:
+            member = guild.get_member(int(user_id))
+            if member:
+                return member.display_name
+        user = self.client.get_user(int(user_id))
+        if user:
+            return user.display_name
+        return self._cached(user_id)
+
+    async def _fetch(self, user_id: str) -> str:
+        async with self._semaphore:
+            try:
+                user = await self.client.fetch_user(int(user_id))
+            except Exception:
+                name = fallback_name(user_id)
+                self._store(user_id, name, self.negative_ttl)
+                return name
+        self._store(user_id, user.display_name, self.ttl)
+        return user.display_name
+
+    async def _fetch_shared(self, user_id: str) -> str:
+        """Fetch a user, joining an in-flight request for the same ID if any"""
+        future = self._pending.get(user_id)
+        if future is not None:
+            return await future
+        future = asyncio.ensure_future(self._fetch(user_id))
+        self._pending[user_id] = future
+        try:
+            return await future
+        finally:
+            self._pending.pop(user_id, None)
+
+    async def resolve_many(self, user_ids: Iterable[str], guild=None) -> Dict[str, str]:
+        """Resolve a batch of user IDs in one round of concurrent lookups"""
+        names: Dict[str, str] = {}
+        missing = []
+        for user_id in dict.fromkeys(str(u) for u in user_ids):
+            name = self.lookup_cached(user_id, guild)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch_shared(user_id) for user_id in missing))
+            names.update(zip(missing, fetched))
+        return names
+
+    async def resolve(self, user_id: str, guild=None) -> str:
+        """Resolve a single user ID"""
+        return (await self.resolve_many([user_id], guild))[str(user_id)]
@@ -0,0 +1,171 @@
+"""Cursor-based pagination with interactive page buttons."""
+import base64
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional
+
+import discord
+
+# Discord rejects embeds with more than 25 fields
+MAX_PAGE_SIZE = 25
+
+
+def encode_cursor(position) -> str:
+    """Encode a cursor value (a list position, or a key and rank) as an opaque string"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor"""
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+class Page(NamedTuple):
+    items: List            # entries on this page, newest first
+    first_number: int      # 1-based position of the first item, counted from the newest
+    total: int             # total number of entries in the source
+    newer: Optional[str]   # cursor for the previous (newer) page
+    older: Optional[str]   # cursor for the next (older) page
+
+
+class ListPageSource:
+    """Page through a list from the newest entry backwards
+
+    By default a cursor is an absolute list position, which keeps pages
+    stable while entries are appended but not if entries are removed. For
+    lists that also lose entries (gambling logs dropped by retention), pass
+    ``key``, a value the list is sorted by such as a sequence number: cursors then
+    name the entry a page ends at and are looked up again when the page is
+    turned. Only the requested page is sliced out of the list.
+    """
+
+    def __init__(self, entries: List, per_page: int = 10, key: Optional[Callable[[Any], Any]] = None):
+        self.entries = entries
+        self.per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+        self.key = key
+
+    def _lower_bound(self, value, upper: bool = False) -> int:
+        """First position whose key is >= value (> value with ``upper``)"""
+        low, high = 0, len(self.entries)
+        while low < high:
+            middle = (low + high) // 2
+            entry_key = self.key(self.entries[middle])
+            if entry_key < value or (upper and entry_key == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _cursor(self, end: int) -> str:
+        """Cursor for the page ending (exclusively) at ``end``"""
+        if self.key is None:
+            return encode_cursor(end)
+        if end == 0:
+            return encode_cursor(None)
+        # The last entry before the end, as its key and rank among equal keys
+        value = self.key(self.entries[end - 1])
+        return encode_cursor([value, end - 1 - self._lower_bound(value)])
+
+    def _resolve(self, cursor: str) -> int:
+        position = decode_cursor(cursor)
+        if self.key is None:
+            return position
+        if position is None:
+            return 0
+        value, rank = position
+        return min(self._lower_bound(value) + rank + 1, self._lower_bound(value, upper=True))
+
+    def first_cursor(self) -> str:
+        """Cursor for the newest page"""
+        return self._cursor(len(self.entries))
+
+    def get_page(self, cursor: str) -> Page:
+        """Fetch the page ending (exclusively) at the cursor position"""
+        total = len(self.entries)
+        end = max(0, min(self._resolve(cursor), total))
+        start = max(0, end - self.per_page)
+        items = self.entries[start:end]
+        items.reverse()
+
+        newer = self._cursor(min(end + self.per_page, total)) if end < total else None
+        older = self._cursor(start) if start > 0 else None
+        return Page(items, total - end + 1, total, newer, older)
+
+
+class PaginatorView(discord.ui.View):
+    """Buttons for scrolling through a page source
+
+    Pages are rendered on demand by ``render`` and the resulting embeds are
+    cached, so flicking back and forth never re-renders a page. Only the user
+    who ran the command can turn the pages.
+    """
+
+    def __init__(self, source: ListPageSource, render: Callable[[Page], Awaitable[discord.Embed]],
+                 author_id: int, timeout: float = 180, cache_size: int = 32):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.render = render
+        self.author_id = author_id
+        self.cache_size = cache_size
+        self.message: Optional[discord.Message] = None
+        self.cursor = source.first_cursor()
+        self._page: Optional[Page] = None
+        self._embeds: 'OrderedDict[tuple, discord.Embed]' = OrderedDict()
+
+    async def current_embed(self) -> discord.Embed:
+        """Fetch and render the page at the current cursor"""
+        self._page = self.source.get_page(self.cursor)
+        key = (self.cursor, self._page.total)
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = await self.render(self._page)
+            self._embeds[key] = embed
+            if len(self._embeds) > self.cache_size:
+                self._embeds.popitem(last=False)
+        else:
+            self._embeds.move_to_end(key)
+
+        self.newer_button.disabled = self._page.newer is None
+        self.older_button.disabled = self._page.older is None
+        return embed
+
+    async def send(self, ctx):
+        """Send the first page, with buttons only if there is more than one page"""
+        embed = await self.current_embed()
+        if self._page.newer is None and self._page.older is None:
+            self.stop()
+            self.message = await ctx.send(embed=embed)
+        else:
+            self.message = await ctx.send(embed=embed, view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Only the person who ran this command can change pages.", ephemeral=True)
+            return False
+        return True
+
+    async def _turn(self, interaction: discord.Interaction, cursor: Optional[str]):
+        # Acknowledge first: rendering may resolve names over HTTP, which can
+        # outlast the 3 seconds Discord allows before an interaction fails
+        await interaction.response.defer()
+        if cursor is not None:
+            self.cursor = cursor
+        embed = await self.current_embed()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, self._page.newer if self._page else None)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, self._page.older if self._page else None)
+
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
@@ -0,0 +1,134 @@
+"""Pokemon name index for lookups and slash-command autocomplete.
+
+Built once from the full list of Pokemon names. Prefix queries walk a trie
+whose nodes keep their first few completions, so they cost O(len(prefix)).
+Queries with no prefix match fall back to a trigram index to find
+candidates, ranked by a bounded edit distance.
+"""
+import heapq
+import re
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+# Completions kept on each trie node; Discord shows at most 25 choices
+NODE_COMPLETIONS = 25
+MAX_EDIT_DISTANCE = 3
+
+
+def normalize(name: str) -> str:
+    """Lowercase and drop everything but letters and digits ("Mr. Mime" -> "mrmime")"""
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_edit_distance(a: str, b: str, bound: int) -> int:
+    """Levenshtein distance between a and b, or bound + 1 if it exceeds bound
+
+    Only the diagonal band of width 2 * bound + 1 is computed, and the scan
+    stops as soon as a whole row exceeds the bound.
+    """
+    too_far = bound + 1
+    if abs(len(a) - len(b)) > bound:
+        return too_far
+    previous = [j if j <= bound else too_far for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= bound:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - bound), min(len(b), i + bound) + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > bound:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+class PokedexIndex:
+    """Prefix trie plus fuzzy matcher over Pokemon names"""
+
+    def __init__(self, names: Dict[int, str]):
+        # pokemon_id -> display name
+        self.names = dict(sorted(names.items()))
+        self.keys: Dict[int, str] = {}
+        self.by_key: Dict[str, int] = {}
+        self.trie: Dict = {}
+        self.grams: Dict[str, List[int]] = {}
+
+        for pokemon_id, name in self.names.items():
+            key = self.keys[pokemon_id] = normalize(name)
+            self.by_key.setdefault(key, pokemon_id)
+            node = self.trie
+            for char in key:
+                node = node.setdefault(char, {'': []})
+                # IDs arrive in ascending order, so each node keeps the lowest ones
+                if len(node['']) < NODE_COMPLETIONS:
+                    node[''].append(pokemon_id)
+            for gram in set(trigrams(key)):
+                self.grams.setdefault(gram, []).append(pokemon_id)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def resolve(self, query: str) -> Optional[int]:
+        """Exact lookup by ID (optionally #-prefixed) or name"""
+        query = query.strip().lstrip('#')
+        if query.isdigit():
+            pokemon_id = int(query)
+            return pokemon_id if pokemon_id in self.names else None
+        return self.by_key.get(normalize(query))
+
+    def prefix(self, query: str, limit: int = NODE_COMPLETIONS) -> List[int]:
+        """IDs of Pokemon whose name starts with the query"""
+        node = self.trie
+        for char in normalize(query):
+            node = node.get(char)
+            if node is None:
+                return []
+        if node is self.trie:
+            return list(self.names)[:limit]
+        return node[''][:limit]
+
+    def fuzzy(self, query: str, limit: int = NODE_COMPLETIONS, candidates: int = 30) -> List[int]:
+        """IDs of Pokemon whose name is close to the query, best match first"""
+        key = normalize(query)
+        if not key:
+            return []
+        shared: Dict[int, int] = {}
+        for gram in set(trigrams(key)):
+            for pokemon_id in self.grams.get(gram, ()):
+                shared[pokemon_id] = shared.get(pokemon_id, 0) + 1
+        shortlist = heapq.nlargest(candidates, shared.items(), key=itemgetter(1))
+
+        bound = min(MAX_EDIT_DISTANCE, max(1, len(key) // 3))
+        scored: List[Tuple[int, int, int]] = []
+        for pokemon_id, count in shortlist:
+            name_key = self.keys[pokemon_id]
+            # Compare against the start of longer names, so "garchom" still finds Garchomp
+            distance = bounded_edit_distance(key, name_key[:len(key)], bound)
+            if distance <= bound:
+                scored.append((distance, -count, pokemon_id))
+        return [pokemon_id for _, _, pokemon_id in sorted(scored)[:limit]]
+
+    def search(self, query: str, limit: int = NODE_COMPLETIONS) -> List[Tuple[int, str]]:
+        """Autocomplete: prefix matches first, topped up with fuzzy matches"""
+        query = query.strip().lstrip('#')
+        if query.isdigit():
+            ids = [pokemon_id for pokemon_id in (int(query),) if pokemon_id in self.names]
+        else:
+            ids = self.prefix(query, limit)
+        if len(ids) < limit:
+            seen = set(ids)
+            ids += [pokemon_id for pokemon_id in self.fuzzy(query, limit) if pokemon_id not in seen][:limit - len(ids)]
+        return [(pokemon_id, self.names[pokemon_id]) for pokemon_id in ids]
@@ -0,0 +1,110 @@
+"""Per-guild retention for gambling logs.
+
+``gambling_logs`` grows with every result, and saves, ``!logs`` and exports
+all pay for its length. Guilds can set a retention window: logs older than
+it are folded into ``gambling_summary`` and dropped from the list.
+
+``gambling_summary`` holds what the dropped logs contributed:
+
+    {'pairs': {"user_a:user_b": rivalry record, see RivalryIndex.dump},
+     'guilds': {guild: {'entries', 'first_timestamp', 'last_timestamp'}},
+     'passes': [recent compaction passes, newest last]}
+
+so the rivalry index, and the lifetime wins/losses derived from it, can
+still be rebuilt exactly from the summary plus the remaining logs. (Only a
+pair's streak can drift, and only if the pair gambles in several guilds
+with different retention windows.)
+
+``LogCompaction`` works in slices so it can run as a background job: it
+scans ``chunk_size`` logs per step and commits everything at once at the
+end, with no await in between, so a save in the middle of a pass never
+sees a log both folded and still listed.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from indexes import RivalryIndex, guild_key
+
+MAX_PASS_HISTORY = 20
+
+
+def empty_summary() -> Dict:
+    return {'pairs': {}, 'guilds': {}, 'passes': []}
+
+
+class LogCompaction:
+    """One compaction pass over the gambling logs, run a slice at a time"""
+
+    def __init__(self, logs: List[Dict], summary: Dict, policies: Dict[str, int], default_days: Optional[int] = None,
+                 now: Optional[datetime] = None, chunk_size: int = 500):
+        """``policies`` maps guild -> days to keep (0 keeps everything); other guilds use ``default_days``"""
+        self.logs = logs
+        self.summary = summary
+        now = now or datetime.now()
+        # guild -> ISO timestamp logs must be newer than (None: keep everything)
+        self.cutoffs = {guild: self._cutoff(days, now) for guild, days in policies.items()}
+        self.default_cutoff = self._cutoff(default_days, now)
+        self.chunk_size = chunk_size
+        self.started = time.perf_counter()
+        self.scanned = 0
+        self.kept: List[Dict] = []
+        self.expired: List[Dict] = []
+        self.bytes = 0
+
+    @staticmethod
+    def _cutoff(days: Optional[int], now: datetime) -> Optional[str]:
+        return (now - timedelta(days=days)).isoformat() if days else None
+
+    def chunks(self) -> Iterator[int]:
+        """Scan the logs present when the pass started, yielding the number expired after each slice"""
+        end = len(self.logs)
+        while self.scanned < end:
+            stop = min(self.scanned + self.chunk_size, end)
+            for log in self.logs[self.scanned:stop]:
+                cutoff = self.cutoffs.get(guild_key(log.get('guild_id')), self.default_cutoff)
+                if cutoff is not None and log['timestamp'] < cutoff:
+                    self.expired.append(log)
+                    self.bytes += len(json.dumps(log, separators=(',', ':')))
+                else:
+                    self.kept.append(log)
+            self.scanned = stop
+            yield len(self.expired)
+
+    def commit(self) -> Dict:
+        """Fold expired logs into the summary and drop them; returns the pass record
+
+        Logs appended while the pass ran are past ``scanned`` and untouched.
+        """
+        folded = RivalryIndex()
+        folded.load(self.summary['pairs'])
+        by_guild: Dict[str, int] = {}
+        for log in self.expired:
+            folded.add(log['winner_id'], log['loser_id'], log['timestamp'])
+            guild = guild_key(log.get('guild_id'))
+            by_guild[guild] = by_guild.get(guild, 0) + 1
+            totals = self.summary['guilds'].setdefault(
+                guild, {'entries': 0, 'first_timestamp': log['timestamp'], 'last_timestamp': log['timestamp']}
+            )
+            totals['entries'] += 1
+            totals['first_timestamp'] = min(totals['first_timestamp'], log['timestamp'])
+            totals['last_timestamp'] = max(totals['last_timestamp'], log['timestamp'])
+
+        if self.expired:
+            self.summary['pairs'] = folded.dump()
+            self.logs[:self.scanned] = self.kept
+
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'scanned': self.scanned,
+            'removed': len(self.expired),
+            'bytes': self.bytes,
+            'remaining': len(self.logs),
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'guilds': by_guild
+        }
+        passes = self.summary['passes']
+        passes.append(record)
+        del passes[:-MAX_PASS_HISTORY]
+        return record
@@ -0,0 +1,128 @@
+"""Time-bucketed activity counters for windowed stats.
+
+Counters live in ``ewager.data['rollups']`` so they survive restarts:
+
+    {'users':  {user_id:  {'hourly': {'2024-01-31T13': {'rolls': 2}}, 'daily': {'2024-01-31': {...}}}},
+     'guilds': {guild_id: {...}}}
+
+Bucket keys are prefixes of the ISO timestamps stored on every event, so
+recording an event never has to parse a date. Every event bumps both its
+hourly and daily bucket; compaction just drops hourly buckets once they
+fall out of the hourly window, and daily buckets past the retention window.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HOURLY_RETENTION = timedelta(hours=48)
+DAILY_RETENTION = timedelta(days=400)
+
+
+def hour_key(timestamp: str) -> str:
+    return timestamp[:13]
+
+
+def day_key(timestamp: str) -> str:
+    return timestamp[:10]
+
+
+class Rollups:
+    """Per-user and per-guild hourly/daily counters"""
+
+    def __init__(self, store: Dict):
+        self.store = store
+        self.store.setdefault('users', {})
+        self.store.setdefault('guilds', {})
+
+    def _series(self, scope: str, key: str) -> Dict:
+        series = self.store[scope].get(key)
+        if series is None:
+            series = self.store[scope][key] = {'hourly': {}, 'daily': {}}
+        return series
+
+    def record(self, scope: str, key: Optional[str], metric: str, timestamp: str, amount: int = 1):
+        """Add to a counter in the buckets covering a timestamp"""
+        if not key:
+            return
+        series = self._series(scope, key)
+        hour = hour_key(timestamp)
+        if hour not in series['hourly']:
+            # A new hour has started for this series; drop expired buckets first
+            self._compact_series(series, timestamp)
+        for buckets, bucket_key in ((series['hourly'], hour), (series['daily'], day_key(timestamp))):
+            bucket = buckets.setdefault(bucket_key, {})
+            bucket[metric] = bucket.get(metric, 0) + amount
+
+    def record_roll(self, user_id: str, guild_id: Optional[str], timestamp: str):
+        self.record('users', user_id, 'rolls', timestamp)
+        self.record('guilds', guild_id, 'rolls', timestamp)
+
+    def record_gamble(self, winner_id: str, loser_id: str, guild_id: Optional[str], timestamp: str):
+        self.record('users', winner_id, 'wins', timestamp)
+        self.record('users', loser_id, 'losses', timestamp)
+        self.record('guilds', guild_id, 'gambles', timestamp)
+
+    def _compact_series(self, series: Dict, now: str) -> int:
+        current = datetime.fromisoformat(now)
+        oldest_hour = hour_key((current - HOURLY_RETENTION).isoformat())
+        oldest_day = day_key((current - DAILY_RETENTION).isoformat())
+        removed = 0
+        for buckets, oldest in ((series['hourly'], oldest_hour), (series['daily'], oldest_day)):
+            for bucket_key in [k for k in buckets if k < oldest]:
+                del buckets[bucket_key]
+                removed += 1
+        return removed
+
+    def compact_chunks(self, now: Optional[datetime] = None, chunk_size: int = 500) -> Iterator[int]:
+        """Drop expired buckets ``chunk_size`` series at a time, yielding the count removed per chunk"""
+        timestamp = (now or datetime.now()).isoformat()
+        for scope in ('users', 'guilds'):
+            # Copy so series created between chunks can't break iteration
+            series_list = list(self.store[scope].values())
+            for start in range(0, len(series_list), chunk_size):
+                yield sum(self._compact_series(series, timestamp) for series in series_list[start:start + chunk_size])
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """Drop expired buckets from every series, returning how many were removed"""
+        return sum(self.compact_chunks(now))
+
+    def daily(self, scope: str, key: str, days: int, now: Optional[datetime] = None) -> List[Tuple[str, Dict[str, int]]]:
+        """Daily buckets for the last ``days`` days, oldest first"""
+        now = now or datetime.now()
+        buckets = self.store[scope].get(key, {}).get('daily', {})
+        keys = [(now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+        return [(k, buckets.get(k, {})) for k in keys]
+
+    def hourly(self, scope: str, key: str, hours: int, now: Optional[datetime] = None) -> List[Tuple[str, Dict[str, int]]]:
+        """Hourly buckets for the last ``hours`` hours, oldest first"""
+        now = now or datetime.now()
+        buckets = self.store[scope].get(key, {}).get('hourly', {})
+        keys = [(now - timedelta(hours=i)).strftime('%Y-%m-%dT%H') for i in range(hours - 1, -1, -1)]
+        return [(k, buckets.get(k, {})) for k in keys]
+
+    def window(self, scope: str, key: str, days: int, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Totals over the last ``days`` days (including today)"""
+        totals: Dict[str, int] = {}
+        for _, bucket in self.daily(scope, key, days, now):
+            for metric, count in bucket.items():
+                totals[metric] = totals.get(metric, 0) + count
+        return totals
+
+    def rebuild(self, data: Dict):
+        """Rebuild every counter from stored rolls and gambling logs"""
+        self.store['users'] = {}
+        self.store['guilds'] = {}
+        for user_id, user_data in data['users'].items():
+            for roll in user_data.get('pokemon_rolls', []):
+                self.record_roll(user_id, roll.get('guild_id'), roll['timestamp'])
+        for log in data['gambling_logs']:
+            self.record_gamble(log['winner_id'], log['loser_id'], log.get('guild_id'), log['timestamp'])
+        self.compact()
+
+
+def sparkline(values: List[int]) -> str:
+    """Render a list of counts as a compact bar chart"""
+    bars = '▁▂▃▄▅▆▇█'
+    peak = max(values) if values else 0
+    if peak == 0:
+        return bars[0] * len(values)
+    return ''.join(bars[(v * (len(bars) - 1) + peak - 1) // peak] for v in values)
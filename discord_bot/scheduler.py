@@ -0,0 +1,140 @@
+"""Priority lanes for interactive commands versus background work.
+
+* ``interactive``: command and roll handlers. They run directly on the event
+  loop; the scheduler only tracks them so other lanes can get out of the way.
+* ``background``: maintenance jobs (compaction, exports, ...) run one at a
+  time by a worker task. Jobs split their work into chunks and call
+  ``await scheduler.pause()`` between chunks, which yields to the loop and
+  waits (briefly) while any interactive handler is in flight.
+* ``cpu``: CPU-heavy functions run in a process pool so they don't hold the
+  GIL on the event loop's process.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from events import LatencyTracker
+
+LANES = ('interactive', 'background', 'cpu')
+
+
+def _run_timed(func: Callable, args: tuple):
+    """Run ``func`` in a pool process, reporting when it actually started"""
+    return time.time(), func(*args)
+
+
+class WorkScheduler:
+    """Runs work in interactive, background and CPU lanes with per-lane metrics"""
+
+    def __init__(self, cpu_workers: Optional[int] = None, max_yield_delay: float = 0.5):
+        self.cpu_workers = cpu_workers
+        self.max_yield_delay = max_yield_delay
+        self.metrics = LatencyTracker()
+        # Items waiting or running in each lane
+        self.depth: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+        self._background: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Start the background worker on the running loop"""
+        if self._worker is None:
+            self._background = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run_background())
+
+    @asynccontextmanager
+    async def interactive(self, name: str, waited: Optional[float] = None):
+        """Mark an interactive handler as in flight for the duration of the block"""
+        if waited is not None:
+            self.metrics.record('wait', 'interactive', max(0.0, waited))
+        self.depth['interactive'] += 1
+        self._interactive_idle.clear()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.metrics.record('run', f'interactive:{name}', time.perf_counter() - started)
+            self.depth['interactive'] -= 1
+            if self.depth['interactive'] == 0:
+                self._interactive_idle.set()
+
+    async def pause(self):
+        """Yield between chunks of background work, deferring to interactive handlers"""
+        await asyncio.sleep(0)
+        if self.depth['interactive']:
+            try:
+                await asyncio.wait_for(self._interactive_idle.wait(), self.max_yield_delay)
+            except asyncio.TimeoutError:
+                # Don't let a steady stream of commands starve background work forever
+                pass
+
+    async def submit(self, name: str, job: Callable, *args) -> asyncio.Future:
+        """Queue ``await job(*args)`` in the background lane; returns a future for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.depth['background'] += 1
+        await self._background.put((name, job, args, future, time.perf_counter()))
+        return future
+
+    async def _run_background(self):
+        while True:
+            name, job, args, future, queued_at = await self._background.get()
+            self.metrics.record('wait', 'background', time.perf_counter() - queued_at)
+            started = time.perf_counter()
+            try:
+                result = await job(*args)
+            except Exception as e:
+                print(f"Background job {name} failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.metrics.record('run', f'background:{name}', time.perf_counter() - started)
+                self.depth['background'] -= 1
+
+    async def run_blocking(self, name: str, func: Callable, *args):
+        """Run blocking I/O-bound work in a thread, counted against the background lane"""
+        self.depth['background'] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        finally:
+            self.metrics.record('run', f'background:{name}', time.perf_counter() - started)
+            self.depth['background'] -= 1
+
+    async def run_cpu(self, name: str, func: Callable, *args):
+        """Run a picklable CPU-heavy function in the process pool"""
+        if self._cpu_pool is None:
+            self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        self.depth['cpu'] += 1
+        queued_at = time.time()
+        try:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(
+                self._cpu_pool, _run_timed, func, args
+            )
+        finally:
+            self.depth['cpu'] -= 1
+        self.metrics.record('wait', 'cpu', max(0.0, started_at - queued_at))
+        self.metrics.record('run', f'cpu:{name}', time.time() - started_at)
+        return result
+
+    def summary(self) -> List[Tuple[str, int, Optional[float], Optional[float]]]:
+        """Return (lane, depth, wait_p50_ms, wait_p99_ms) for every lane"""
+        waits = {name: (p50, p99) for kind, name, count, p50, p99 in self.metrics.summary() if kind == 'wait'}
+        return [(lane, self.depth[lane]) + waits.get(lane, (None, None)) for lane in LANES]
+
+    async def close(self):
+        """Finish queued background jobs and shut the process pool down"""
+        if self._worker is not None:
+            while self.depth['background']:
+                await asyncio.sleep(0.05)
+            self._worker.cancel()
+            self._worker = None
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(cancel_futures=True)
+            self._cpu_pool = None
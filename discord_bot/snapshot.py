@@ -0,0 +1,241 @@
+"""Binary snapshot storage with lazy per-record deserialization.
+
+Layout of a snapshot file:
+
+    b'EWSNAP01'                      magic
+    record blobs ...                 one compact JSON blob per user / tournament /
+                                     archived block of ledger rows
+    globals blob                     everything else (logs, rollups, ledger, indexes)
+    index                            JSON: {'globals': [offset, length],
+                                            'users': {user_id: [offset, length]},
+                                            'tournaments': {tournament_id: [offset, length]},
+                                            'ledger_archive': {block: [offset, length]}}
+    uint64 big-endian                offset of the index
+
+The file is memory-mapped on load. Only the index and the globals blob are
+decoded up front; a user, tournament or ledger archive record is decoded
+the first time it is accessed. Saving copies the raw bytes of records that were never loaded,
+so they are never decoded at all.
+
+Saving is split in three so the slow part can leave the event loop:
+``prepare_snapshot`` encodes mutable data (on the loop), ``write_prepared``
+writes and fsyncs the file (in a worker thread) and ``rebase_snapshot``
+points unloaded records at the new file (back on the loop).
+"""
+import json
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+MAGIC = b'EWSNAP01'
+TRAILER = struct.Struct('>Q')
+LAZY_SECTIONS = ('users', 'tournaments', 'ledger_archive')
+
+
+def encode(record) -> bytes:
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+class Snapshot:
+    """A read-only memory-mapped snapshot file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC) + TRAILER.size:
+                raise ValueError(f"{path} is too small to be a snapshot")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an EWagerBot snapshot")
+        (index_offset,) = TRAILER.unpack(self.map[-TRAILER.size:])
+        self.index = json.loads(self.map[index_offset:-TRAILER.size])
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self.map[offset:offset + length]
+
+    def decode(self, offset: int, length: int):
+        return json.loads(self.read(offset, length))
+
+
+# Where an undecoded record lives: encoded bytes, or (snapshot, offset, length)
+Source = Union[bytes, Tuple[Snapshot, int, int]]
+
+
+def decode_source(source: Source):
+    """Decode a record from its encoded bytes or snapshot location"""
+    if isinstance(source, bytes):
+        return json.loads(source)
+    snapshot, offset, length = source
+    return snapshot.decode(offset, length)
+
+
+class LazyRecords(MutableMapping):
+    """Dict of records that decodes each one from a snapshot on first access"""
+
+    def __init__(self, snapshot: Optional[Snapshot] = None, section: Optional[str] = None):
+        # key -> Source for records not decoded yet
+        self._unloaded: Dict[str, Source] = {}
+        self._loaded: Dict[str, Dict] = {}
+        if snapshot is not None:
+            # Sections added after a snapshot was written are simply empty in it
+            self._unloaded = {key: (snapshot, offset, length)
+                              for key, (offset, length) in snapshot.index.get(section, {}).items()}
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+        record = self._loaded[key] = decode_source(self._unloaded.pop(key))
+        return record
+
+    def __setitem__(self, key, value):
+        self._unloaded.pop(key, None)
+        self._loaded[key] = value
+
+    def __delitem__(self, key):
+        if key in self._loaded:
+            del self._loaded[key]
+        else:
+            del self._unloaded[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._loaded or key in self._unloaded
+
+    def __iter__(self) -> Iterator[str]:
+        # Both key sets are copied up front: reading a record while iterating
+        # moves it from unloaded to loaded, and must not yield it twice
+        return iter(list(self._unloaded) + list(self._loaded))
+
+    def __len__(self) -> int:
+        return len(self._loaded) + len(self._unloaded)
+
+    def loaded_items(self) -> List[Tuple[str, Dict]]:
+        """Records that have been decoded so far"""
+        return list(self._loaded.items())
+
+    def put_encoded(self, key: str, blob: bytes):
+        """Store a new record that won't change again as its encoded bytes
+
+        Saves copy the bytes as they are instead of re-encoding the record,
+        and afterwards it is read from the snapshot like any other record
+        that was never loaded.
+        """
+        self._loaded.pop(key, None)
+        self._unloaded[key] = blob
+
+    def locate(self, keys: Iterable[str]) -> List[Tuple[str, Union[Dict, Source]]]:
+        """Each key's decoded record, or the Source to decode it from
+
+        Taken on the event loop, so a worker thread can read the records
+        later without keeping them decoded or racing loads and rebases.
+        Unknown keys are skipped.
+        """
+        located = []
+        for key in keys:
+            source = self._loaded.get(key)
+            if source is None:
+                source = self._unloaded.get(key)
+            if source is not None:
+                located.append((key, source))
+        return located
+
+    def sources(self) -> List[Tuple[str, Source]]:
+        """Every record as encoded bytes (loaded or stored encoded) or its location in a snapshot"""
+        sources = list(self._unloaded.items())
+        sources.extend((key, encode(record)) for key, record in self._loaded.items())
+        return sources
+
+    def rebase(self, snapshot: Snapshot, offsets: Dict[str, Tuple[int, int]]):
+        """Point records that were never loaded at a newly written snapshot
+
+        Records only join the unloaded set through ``put_encoded`` under new
+        keys; any added since ``offsets`` was written keep their bytes until
+        the next save.
+        """
+        for key in self._unloaded:
+            if key in offsets:
+                offset, length = offsets[key]
+                self._unloaded[key] = (snapshot, offset, length)
+
+
+def load_snapshot(path: str) -> Tuple[Dict, Dict]:
+    """Load a snapshot, returning (data, indexes) with the LAZY_SECTIONS left lazy"""
+    snapshot = Snapshot(path)
+    offset, length = snapshot.index['globals']
+    globals_blob = snapshot.decode(offset, length)
+    data = globals_blob['data']
+    for section in LAZY_SECTIONS:
+        data[section] = LazyRecords(snapshot, section)
+    return data, globals_blob.get('indexes', {})
+
+
+class PreparedSnapshot(NamedTuple):
+    # section -> [(key, Source of the record's bytes)]
+    records: Dict[str, List[Tuple[str, Source]]]
+    globals_blob: bytes
+
+
+def prepare_snapshot(data: Dict, indexes: Optional[Dict] = None) -> PreparedSnapshot:
+    """Encode everything that can still change, so the file can be written off the event loop
+
+    Records that were never loaded are only referenced: they live in a
+    read-only snapshot that nothing modifies.
+    """
+    records = {}
+    for section in LAZY_SECTIONS:
+        section_records = data.get(section, {})
+        if isinstance(section_records, LazyRecords):
+            records[section] = section_records.sources()
+        else:
+            records[section] = [(key, encode(record)) for key, record in section_records.items()]
+    globals_blob = encode({
+        'data': {key: value for key, value in data.items() if key not in LAZY_SECTIONS},
+        'indexes': indexes or {}
+    })
+    return PreparedSnapshot(records, globals_blob)
+
+
+def write_prepared(path: str, prepared: PreparedSnapshot) -> Dict[str, Dict[str, Tuple[int, int]]]:
+    """Atomically write a prepared snapshot, returning each section's record offsets
+
+    Safe to run in a worker thread: it only reads bytes and read-only maps.
+    """
+    tmp_path = f"{path}.tmp"
+    index = {}
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        position = len(MAGIC)
+        for section in LAZY_SECTIONS:
+            offsets = index[section] = {}
+            for key, source in prepared.records[section]:
+                blob = source if isinstance(source, bytes) else source[0].read(source[1], source[2])
+                f.write(blob)
+                offsets[key] = (position, len(blob))
+                position += len(blob)
+
+        f.write(prepared.globals_blob)
+        index['globals'] = (position, len(prepared.globals_blob))
+        position += len(prepared.globals_blob)
+
+        f.write(encode(index))
+        f.write(TRAILER.pack(position))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return {section: index[section] for section in LAZY_SECTIONS}
+
+
+def rebase_snapshot(path: str, data: Dict, offsets: Dict[str, Dict[str, Tuple[int, int]]]):
+    """Point records that are still unloaded at the file ``write_prepared`` just wrote"""
+    snapshot = Snapshot(path)
+    for section in LAZY_SECTIONS:
+        if isinstance(data.get(section), LazyRecords):
+            data[section].rebase(snapshot, offsets[section])
+
+
+def write_snapshot(path: str, data: Dict, indexes: Optional[Dict] = None):
+    """Atomically write data (plus derived indexes) to a snapshot file"""
+    rebase_snapshot(path, data, write_prepared(path, prepare_snapshot(data, indexes)))
@@ -0,0 +1,180 @@
+"""Sprite cache and composited sprite grids.
+
+Sprite PNGs are cached on disk under ``SPRITE_DIR`` and looked up in
+``SPRITE_FIXTURES_DIR`` (``<pokemon_id>.png`` files) before anything is
+downloaded, so the bot and benchmarks can run offline. Grids of sprites are
+composited by ``composite_grid``, a plain picklable function meant to run in
+a process pool, and memoized on disk by a hash of their contents. The
+composites directory holds at most ``max_composites`` files; the least
+recently used are deleted once it grows past that.
+
+Compositing needs Pillow; without it ``HAS_PIL`` is False and callers should
+fall back to plain embeds.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from typing import Dict, List, Optional
+
+import aiohttp
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+SPRITE_DIR = 'sprite_cache'
+SPRITE_FIXTURES_DIR = os.getenv('SPRITE_FIXTURES_DIR')
+SPRITE_URL = 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{pokemon_id}.png'
+CELL_SIZE = 96
+MAX_COMPOSITES = int(os.getenv('MAX_SPRITE_COMPOSITES', '500'))
+
+
+def composite_grid(sprites: List[Optional[bytes]], columns: int, cell: int = CELL_SIZE) -> bytes:
+    """Paste sprites into a grid, left to right then top to bottom, returning PNG bytes
+
+    Missing sprites (None) leave their cell empty.
+    """
+    rows = (len(sprites) + columns - 1) // columns
+    grid = Image.new('RGBA', (columns * cell, rows * cell), (0, 0, 0, 0))
+    for i, data in enumerate(sprites):
+        if not data:
+            continue
+        with Image.open(io.BytesIO(data)) as sprite:
+            sprite = sprite.convert('RGBA')
+            if sprite.size != (cell, cell):
+                sprite.thumbnail((cell, cell))
+            x = (i % columns) * cell + (cell - sprite.width) // 2
+            y = (i // columns) * cell + (cell - sprite.height) // 2
+            grid.paste(sprite, (x, y), sprite)
+    output = io.BytesIO()
+    grid.save(output, format='PNG')
+    return output.getvalue()
+
+
+class SpriteCache:
+    """Disk-backed cache of sprite PNGs and memoized composites"""
+
+    def __init__(self, directory: str = SPRITE_DIR, fixtures: Optional[str] = SPRITE_FIXTURES_DIR,
+                 max_concurrency: int = 8, max_composites: int = MAX_COMPOSITES):
+        self.directory = directory
+        self.fixtures = fixtures
+        self.composite_dir = os.path.join(directory, 'composites')
+        self.max_composites = max_composites
+        self._composite_count: Optional[int] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._digests: Dict[int, str] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    def _path(self, pokemon_id: int) -> str:
+        return os.path.join(self.directory, f'{pokemon_id}.png')
+
+    def _read_local(self, pokemon_id: int) -> Optional[bytes]:
+        for directory in (self.directory, self.fixtures):
+            if directory:
+                path = os.path.join(directory, f'{pokemon_id}.png')
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        return f.read()
+        return None
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _download(self, pokemon_id: int, url: Optional[str]) -> Optional[bytes]:
+        async with self._semaphore:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url or SPRITE_URL.format(pokemon_id=pokemon_id)) as response:
+                        if response.status != 200:
+                            return None
+                        data = await response.read()
+            except Exception:
+                return None
+        self._write(self._path(pokemon_id), data)
+        return data
+
+    async def get(self, pokemon_id: int, url: Optional[str] = None) -> Optional[bytes]:
+        """Sprite PNG bytes for a Pokemon, from disk, fixtures or the network"""
+        data = self._read_local(pokemon_id)
+        if data is not None:
+            return data
+        future = self._pending.get(pokemon_id)
+        if future is not None:
+            return await future
+        future = asyncio.ensure_future(self._download(pokemon_id, url))
+        self._pending[pokemon_id] = future
+        try:
+            return await future
+        finally:
+            self._pending.pop(pokemon_id, None)
+
+    async def get_many(self, pokemon_ids: List[int], urls: Optional[List[Optional[str]]] = None) -> List[Optional[bytes]]:
+        """Fetch several sprites concurrently, in order"""
+        urls = urls or [None] * len(pokemon_ids)
+        return await asyncio.gather(*(self.get(pokemon_id, url) for pokemon_id, url in zip(pokemon_ids, urls)))
+
+    def _digest(self, pokemon_id: int, data: Optional[bytes]) -> str:
+        if not data:
+            return '-'
+        digest = self._digests.get(pokemon_id)
+        if digest is None:
+            digest = self._digests[pokemon_id] = hashlib.sha1(data).hexdigest()
+        return digest
+
+    def composite_key(self, pokemon_ids: List[int], sprites: List[Optional[bytes]], columns: int) -> str:
+        """Content hash identifying a composite of these sprites in this layout"""
+        parts = [f'{columns}x{CELL_SIZE}'] + [self._digest(i, data) for i, data in zip(pokemon_ids, sprites)]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+    async def composite(self, pokemon_ids: List[int], columns: int, run_cpu, urls: Optional[List[Optional[str]]] = None) -> Optional[str]:
+        """Path of a PNG grid of these Pokemon's sprites, building it only if not cached
+
+        ``run_cpu(name, func, *args)`` runs the compositing off the event loop
+        (e.g. ``WorkScheduler.run_cpu``). Returns None without Pillow or sprites.
+        """
+        if not HAS_PIL or not pokemon_ids:
+            return None
+        sprites = await self.get_many(pokemon_ids, urls)
+        if not any(sprites):
+            return None
+        path = os.path.join(self.composite_dir, f'{self.composite_key(pokemon_ids, sprites, columns)}.png')
+        try:
+            # Mark as recently used so pruning keeps it
+            os.utime(path)
+        except FileNotFoundError:
+            data = await run_cpu('composite', composite_grid, sprites, columns)
+            self._write(path, data)
+            self._added_composite()
+        return path
+
+    def _composite_files(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.composite_dir) as entries:
+                return [entry for entry in entries if entry.name.endswith('.png')]
+        except FileNotFoundError:
+            return []
+
+    def _added_composite(self):
+        """Count a new composite, deleting the least recently used once over the cap"""
+        if self._composite_count is None:
+            self._composite_count = len(self._composite_files())
+        else:
+            self._composite_count += 1
+        if not self.max_composites or self._composite_count <= self.max_composites:
+            return
+        # Prune down to 90% of the cap so the directory isn't rescanned on every new composite
+        files = sorted(self._composite_files(), key=lambda entry: entry.stat().st_mtime)
+        excess = len(files) - self.max_composites * 9 // 10
+        for entry in files[:max(excess, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self._composite_count = len(files) - max(excess, 0)
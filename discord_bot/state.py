@@ -0,0 +1,171 @@
+"""Locked access to users and tournaments in ``ewager.data``.
+
+Handlers that read a record, decide something and then change it (join a
+tournament if it isn't full, settle what is owed, ...) do so through
+``StateStore`` so the read and the write happen under a lock for that one
+entity. Check-then-act is safe without locks only while there is no await
+between the check and the act; the locks keep it safe once saves, fetches
+or executor calls add one. Locks are per user and per tournament rather
+than global, so unrelated work never waits on them.
+"""
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+MIN_TOURNAMENT_PLAYERS = 4
+
+
+def new_user_record(user_id: str) -> Dict:
+    return {
+        'id': user_id,
+        'pokemon_rolls': [],
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def join_error(tournament: Dict, user_id: str) -> Optional[str]:
+    """Why a user can't join a tournament right now, or None if they can"""
+    if tournament['status'] != 'registration':
+        return 'closed'
+    if user_id in tournament['participants']:
+        return 'already_joined'
+    if len(tournament['participants']) >= tournament['size']:
+        return 'full'
+    return None
+
+
+async def _resolve(value):
+    """Await a callback's result if it returned an awaitable"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, created on demand and dropped once unused"""
+
+    def __init__(self):
+        # key -> [lock, number of holders and waiters]
+        self._locks: Dict[Hashable, List] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        """Hold the locks for all keys, always taken in the same order so two holders can't deadlock"""
+        held: List[Tuple[Hashable, List, bool]] = []
+        try:
+            for key in sorted(set(keys), key=repr):
+                entry = self._locks.get(key)
+                if entry is None:
+                    entry = self._locks[key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                held.append((key, entry, False))
+                await entry[0].acquire()
+                held[-1] = (key, entry, True)
+            yield
+        finally:
+            for key, entry, locked in reversed(held):
+                if locked:
+                    entry[0].release()
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class StateStore:
+    """Per-user and per-tournament locks with compare-and-update helpers"""
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.locks = KeyedLocks()
+
+    def user_lock(self, *user_ids: str):
+        return self.locks.hold(*(('user', user_id) for user_id in user_ids))
+
+    def tournament_lock(self, tournament_id: str):
+        return self.locks.hold(('tournament', tournament_id))
+
+    async def update_user(self, user_id: str, apply: Callable[[Dict], object]) -> Dict:
+        """Create the user if needed and apply a change under their lock"""
+        async with self.user_lock(user_id):
+            users = self.data['users']
+            if user_id not in users:
+                users[user_id] = new_user_record(user_id)
+            user = users[user_id]
+            await _resolve(apply(user))
+            return user
+
+    async def update_tournament(self, tournament_id: str, check: Callable[[Dict], Optional[str]],
+                                apply: Callable[[Dict], object]) -> Tuple[Optional[Dict], Optional[str]]:
+        """Compare-and-update a tournament under its lock
+
+        ``check`` returns an error code (or None to go ahead); ``apply`` makes
+        the change. Either may be a coroutine. Returns (tournament, error),
+        with error 'not_found' for unknown tournaments.
+        """
+        async with self.tournament_lock(tournament_id):
+            tournament = self.data['tournaments'].get(tournament_id)
+            if tournament is None:
+                return None, 'not_found'
+            error = await _resolve(check(tournament))
+            if error:
+                return tournament, error
+            await _resolve(apply(tournament))
+            return tournament, None
+
+    async def create_tournament(self, creator_id: str, size: int) -> Dict:
+        """Create a tournament under a fresh ID"""
+        async with self.locks.hold('tournament_ids'):
+            tournaments = self.data['tournaments']
+            number = len(tournaments) + 1
+            while f"tournament_{number}" in tournaments:
+                number += 1
+            tournament = {
+                'id': f"tournament_{number}",
+                'creator': creator_id,
+                'size': size,
+                'participants': [],
+                'status': 'registration',
+                'created_at': datetime.now().isoformat(),
+                'winner': None
+            }
+            tournaments[tournament['id']] = tournament
+            return tournament
+
+    async def join_tournament(self, tournament_id: str, user_id: str,
+                              before_join: Optional[Callable[[Dict], object]] = None) -> Tuple[Optional[Dict], Optional[str]]:
+        """Add a participant unless the tournament is closed, full or already joined
+
+        ``before_join(tournament)``, if given, runs once the checks pass and
+        before the participant is added, still under the tournament's lock;
+        it may be a coroutine.
+        """
+        async def apply(tournament: Dict):
+            if before_join is not None:
+                await _resolve(before_join(tournament))
+            tournament['participants'].append(user_id)
+
+        return await self.update_tournament(tournament_id, lambda t: join_error(t, user_id), apply)
+
+    async def complete_tournament(self, tournament_id: str, requester_id: str,
+                                  choose_winner: Callable[[List[str]], str]) -> Tuple[Optional[Dict], Optional[str]]:
+        """Close a tournament the requester created, picking a winner from its participants"""
+        def check(tournament: Dict) -> Optional[str]:
+            if tournament['creator'] != requester_id:
+                return 'not_creator'
+            if tournament['status'] != 'registration':
+                return 'closed'
+            if len(tournament['participants']) < MIN_TOURNAMENT_PLAYERS:
+                return 'too_few'
+            return None
+
+        def apply(tournament: Dict):
+            tournament['status'] = 'completed'
+            tournament['winner'] = choose_winner(tournament['participants'])
+            tournament['completed_at'] = datetime.now().isoformat()
+
+        return await self.update_tournament(tournament_id, check, apply)
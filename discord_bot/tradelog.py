@@ -0,0 +1,247 @@
+"""Append-only, size-rotated log of trade channel messages.
+
+Messages are appended as JSON lines to numbered segment files under
+``TRADE_LOG_DIR``; once the active segment reaches ``segment_bytes`` it is
+sealed and a new one started. Each segment keeps a small summary in memory
+(time range, channels, users and keywords seen), saved next to sealed
+segments as ``<segment>.idx`` so startup only rescans the active segment.
+
+Queries use the summaries to skip segments that cannot match and stream
+the remaining ones from disk, newest first, so the log itself is never
+held in memory.
+"""
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set
+
+TRADE_LOG_DIR = 'trade_logs'
+SEGMENT_BYTES = 4 * 1024 * 1024
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+
+WORD_RE = re.compile(r'[a-z0-9]{3,}')
+
+
+def keywords(text: str) -> Set[str]:
+    """Lowercased words of three or more letters/digits"""
+    return set(WORD_RE.findall(text.lower()))
+
+
+class SegmentSummary:
+    """What a segment contains, used to skip it during queries"""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.size = 0
+        self.count = 0
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+        self.channels: Set[str] = set()
+        self.users: Set[str] = set()
+        self.words: Set[str] = set()
+
+    def add(self, entry: Dict, size: int):
+        self.size += size
+        self.count += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = entry['timestamp']
+        self.last_timestamp = entry['timestamp']
+        self.channels.add(entry['channel_id'])
+        self.users.add(entry['user_id'])
+        self.words |= keywords(entry['content'])
+
+    def dump(self) -> Dict:
+        return {
+            'size': self.size,
+            'count': self.count,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'channels': sorted(self.channels),
+            'users': sorted(self.users),
+            'words': sorted(self.words)
+        }
+
+    @classmethod
+    def load(cls, number: int, stored: Dict) -> 'SegmentSummary':
+        summary = cls(number)
+        summary.size = stored['size']
+        summary.count = stored['count']
+        summary.first_timestamp = stored['first_timestamp']
+        summary.last_timestamp = stored['last_timestamp']
+        summary.channels = set(stored['channels'])
+        summary.users = set(stored['users'])
+        summary.words = set(stored['words'])
+        return summary
+
+
+class TradeQuery(NamedTuple):
+    guild_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    user_id: Optional[str] = None
+    since: Optional[str] = None     # ISO timestamp, inclusive
+    until: Optional[str] = None     # ISO timestamp, exclusive
+    words: frozenset = frozenset()  # keywords() that must all appear in the message
+
+    def matches(self, entry: Dict) -> bool:
+        if self.guild_id is not None and entry['guild_id'] != self.guild_id:
+            return False
+        if self.channel_id is not None and entry['channel_id'] != self.channel_id:
+            return False
+        if self.user_id is not None and entry['user_id'] != self.user_id:
+            return False
+        if self.since is not None and entry['timestamp'] < self.since:
+            return False
+        if self.until is not None and entry['timestamp'] >= self.until:
+            return False
+        return not self.words or self.words <= keywords(entry['content'])
+
+    def may_match(self, summary: SegmentSummary) -> bool:
+        if not summary.count:
+            return False
+        if self.channel_id is not None and self.channel_id not in summary.channels:
+            return False
+        if self.user_id is not None and self.user_id not in summary.users:
+            return False
+        if self.since is not None and summary.last_timestamp < self.since:
+            return False
+        if self.until is not None and summary.first_timestamp >= self.until:
+            return False
+        return self.words <= summary.words
+
+
+class TradeLog:
+    """Segment log of trade channel messages with per-segment summaries"""
+
+    def __init__(self, directory: str = TRADE_LOG_DIR, segment_bytes: int = SEGMENT_BYTES,
+                 max_segments: Optional[int] = None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.segments: List[SegmentSummary] = []
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, number: int, suffix: str = SEGMENT_SUFFIX) -> str:
+        return os.path.join(self.directory, f'{number:06d}{suffix}')
+
+    def _load(self):
+        numbers = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        for number in numbers:
+            try:
+                with open(self._path(number, INDEX_SUFFIX)) as f:
+                    self.segments.append(SegmentSummary.load(number, json.load(f)))
+            except (OSError, ValueError, KeyError):
+                self.segments.append(self._scan(number))
+        if not self.segments:
+            self.segments.append(SegmentSummary(1))
+
+    def _scan(self, number: int) -> SegmentSummary:
+        """Rebuild a segment's summary from its contents"""
+        summary = SegmentSummary(number)
+        with open(self._path(number), 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn write from a crash; left out of the size so the next append skips it
+                    break
+                try:
+                    summary.add(json.loads(line), len(line))
+                except (ValueError, KeyError):
+                    summary.size += len(line)
+        return summary
+
+    @property
+    def active(self) -> SegmentSummary:
+        return self.segments[-1]
+
+    def append(self, entry: Dict):
+        """Append a message entry (timestamp, guild_id, channel_id, user_id, message_id, content)"""
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+        if self.active.size and self.active.size + len(line) > self.segment_bytes:
+            self._rotate()
+        if self._file is None:
+            self._file = open(self._path(self.active.number), 'ab')
+            if self._file.tell() > self.active.size:
+                # Terminate a torn last line so this entry starts on its own line
+                self._file.write(b'\n')
+                self.active.size = self._file.tell()
+        self._file.write(line)
+        self._file.flush()
+        self.active.add(entry, len(line))
+
+    def _rotate(self):
+        """Seal the active segment and start a new one"""
+        self.close()
+        sealed = self.active
+        tmp_path = f'{self._path(sealed.number, INDEX_SUFFIX)}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sealed.dump(), f, separators=(',', ':'))
+        os.replace(tmp_path, self._path(sealed.number, INDEX_SUFFIX))
+        self.segments.append(SegmentSummary(sealed.number + 1))
+
+        if self.max_segments:
+            while len(self.segments) > self.max_segments:
+                dropped = self.segments.pop(0)
+                for suffix in (SEGMENT_SUFFIX, INDEX_SUFFIX):
+                    try:
+                        os.remove(self._path(dropped.number, suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def plan(self, query: TradeQuery) -> List[tuple]:
+        """(path, size) of segments that may match, newest first
+
+        Taken on the event loop so ``search`` can run in a thread without
+        touching summaries that are still being appended to.
+        """
+        return [(self._path(summary.number), summary.size)
+                for summary in reversed(self.segments) if query.may_match(summary)]
+
+    @staticmethod
+    def search(plan: List[tuple], query: TradeQuery, limit: int = 250) -> List[Dict]:
+        """The newest ``limit`` matching entries in the planned segments, oldest first"""
+        found: List[Dict] = []
+        for path, size in plan:
+            matches: deque = deque(maxlen=limit - len(found))
+            for entry in TradeLog._read(path, size):
+                if query.matches(entry):
+                    matches.append(entry)
+            found[:0] = matches
+            if len(found) >= limit:
+                break
+        return found
+
+    @staticmethod
+    def _read(path: str, size: int) -> Iterator[Dict]:
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # Dropped by retention since the plan was made
+            return
+        with f:
+            remaining = size
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'segments': len(self.segments),
+            'messages': sum(summary.count for summary in self.segments),
+            'bytes': sum(summary.size for summary in self.segments)
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None